@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+"""
+Benchmark the exporter's parsers and collector against synthetic mfscli
+output.
+
+mfscli is never run - the helpers in moosefs_tricorder.common that shell
+out are swapped for ones that return generated -SIM, -SCS and -SIC output, so
+the numbers only cover our own parsing, collection and rendering.
+
+Every case runs in a fresh interpreter so peak RSS belongs to that case
+alone. Results are compared against benchmarks/baseline.json and any case
+that got slower or hungrier than the tolerance allows is flagged.
+
+    python benchmarks/bench.py                  # run and compare
+    python benchmarks/bench.py --save-baseline  # run and record a new baseline
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+CASES = ("load_master_metrics", "load_chunkserver_metrics", "collect")
+SIZES = (10, 1000, 50000)
+
+
+def synthetic_master_output() -> bytes:
+    """
+    One line of mfscli -SIM -s_ output
+    """
+    return (
+        b"master servers_10.0.0.1_3.0.116_LEADER_1697000000_123456789_0_104857600_"
+        b"all:1.50% sys:0.50% user:1.00%_1697000000_0.5_Saved in background_0xDEADBEEF\n"
+    )
+
+
+def synthetic_chunkserver_output(count: int) -> list:
+    """
+    mfscli -SCS -s^ output for count chunkservers, one bytes line each
+    """
+    lines = []
+    for i in range(count):
+        host = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+        maintenance = "maintenance_on" if i % 97 == 0 else "maintenance_off"
+        used = 1_000_000_000 * (i % 5000 + 1)
+        lines.append(
+            f"chunk servers^{host}^9422^{i + 1}^A,B^3.0.116^{i % 50}^{maintenance}"
+            f"^{100_000 + i}^{used}^{used * 4}\n".encode()
+        )
+    return lines
+
+
+def synthetic_chunk_matrix_output(storage_classes: int = 20) -> list:
+    """
+    mfscli -SIC -s^ output, a full goal by copies matrix per storage class
+    """
+    lines = []
+    for i in range(storage_classes):
+        for goal in range(11):
+            counts = [0] * 11
+            counts[min(goal, 10)] = 1_000_000 + i
+            counts[max(goal - 1, 0)] += 10
+            goal_column = "10+" if goal == 10 else str(goal)
+            lines.append(f"chunks matrix^class{i}^{goal_column}^{'^'.join(map(str, counts))}\n".encode())
+    return lines
+
+
+def stub_mfscli(chunkservers: int):
+    """
+    Point the loaders at synthetic output instead of mfscli
+    """
+    from moosefs_tricorder import common
+
+    master_output = synthetic_master_output()
+    chunkserver_output = synthetic_chunkserver_output(chunkservers)
+    chunk_matrix_output = synthetic_chunk_matrix_output()
+
+    def run(command: list, section: str = "other", timeout: float = None):
+        return (master_output, None)
+
+    def stream(command: list, section: str = "other", timeout: float = None):
+        if "-SIC" in command:
+            yield from chunk_matrix_output
+        else:
+            yield from chunkserver_output
+
+    common.run = run
+    common.stream = stream
+
+
+def make_case(case: str):
+    from moosefs_tricorder import common
+
+    if case == "load_master_metrics":
+        return lambda: common.load_master_metrics("master", 9421)
+    if case == "load_chunkserver_metrics":
+        return lambda: common.load_chunkserver_metrics("master", 9421)
+    if case == "collect":
+        from moosefs_tricorder.exposition import render
+        from moosefs_tricorder.moosefs import MooseCollector
+        from prometheus_client.core import CollectorRegistry
+
+        collector = MooseCollector(moosefs_master="master", moosefs_master_port=9421, chunk_metrics=True)
+        registry = CollectorRegistry(auto_describe=False)
+        registry.register(collector)
+
+        def collect():
+            collector.refresh()
+            list(collector.collect())
+            # What a Prometheus scrape asks for
+            return render(registry).body(openmetrics=False, gzipped=True)
+
+        return collect
+    raise ValueError(f"unknown case {case}")
+
+
+def run_case(case: str, size: int, repeat: int) -> dict:
+    """
+    Time a case, then run it once more under tracemalloc
+    """
+    stub_mfscli(size)
+    fn = make_case(case)
+    fn()  # warm up imports and caches
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    fn()
+    _, peak_alloc = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # ru_maxrss is kilobytes on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        maxrss *= 1024
+    return {
+        "case": case,
+        "size": size,
+        "wall_seconds": min(timings),
+        "peak_alloc_bytes": peak_alloc,
+        "peak_rss_bytes": maxrss,
+    }
+
+
+def run_isolated(case: str, size: int, repeat: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, __file__, "--case", case, "--size", str(size), "--repeat", str(repeat)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """
+    Return a description of every result worse than baseline * (1 + tolerance)
+    """
+    regressions = []
+    for result in results:
+        key = f"{result['case']}/{result['size']}"
+        if key not in baseline:
+            continue
+        for metric in ("wall_seconds", "peak_alloc_bytes", "peak_rss_bytes"):
+            before = baseline[key][metric]
+            after = result[metric]
+            if before and after > before * (1 + tolerance):
+                regressions.append(f"{key} {metric}: {before:.6g} -> {after:.6g} (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def parse_cli():
+    parser = argparse.ArgumentParser(description="Benchmark moosefs-tricorder against synthetic mfscli output")
+    parser.add_argument("--case", choices=CASES, help="Run a single case in this process and print JSON")
+    parser.add_argument("--size", type=int, action="append", help="Chunkserver counts to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case, the fastest is reported")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Fractional slowdown or growth tolerated before flagging a regression",
+    )
+    return parser.parse_args()
+
+
+def main():
+    cli = parse_cli()
+    sizes = cli.size or SIZES
+
+    if cli.case:
+        print(json.dumps(run_case(cli.case, sizes[0], cli.repeat)))
+        return 0
+
+    results = []
+    print(f"{'case':<28}{'chunkservers':>14}{'wall ms':>12}{'peak alloc MiB':>16}{'peak rss MiB':>14}")
+    for case in CASES:
+        for size in sizes:
+            result = run_isolated(case, size, cli.repeat)
+            results.append(result)
+            print(
+                f"{case:<28}{size:>14}{result['wall_seconds'] * 1000:>12.2f}"
+                f"{result['peak_alloc_bytes'] / 2**20:>16.2f}{result['peak_rss_bytes'] / 2**20:>14.1f}"
+            )
+
+    if cli.save_baseline:
+        with open(cli.baseline, "w") as baseline_file:
+            json.dump({f"{r['case']}/{r['size']}": r for r in results}, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"Saved baseline to {cli.baseline}")
+        return 0
+
+    if not os.path.exists(cli.baseline):
+        print(f"No baseline at {cli.baseline}, run with --save-baseline to create one")
+        return 0
+    with open(cli.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = compare(results, baseline, cli.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
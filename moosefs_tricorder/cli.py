@@ -3,6 +3,26 @@
 import argparse
 import logging
 
+from moosefs_tricorder.common import SECTIONS
+
+DEFAULT_MASTER_PORT = 9421
+
+
+def section_interval(value: str) -> tuple:
+    """
+    Parse a SECTION=SECONDS refresh interval
+    """
+    section, _, seconds = value.partition("=")
+    if section not in SECTIONS:
+        raise argparse.ArgumentTypeError(f"unknown section {section}, expected one of {', '.join(SECTIONS)}")
+    try:
+        seconds = float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad interval {seconds!r} for {section}")
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError(f"interval for {section} must be positive")
+    return (section, seconds)
+
 
 def parse_master_cli():
     """
@@ -12,6 +32,45 @@ def parse_master_cli():
         description="Scrape moosefs master for chunkserver stats"
     )
     parser.add_argument("-d", "--debug", help="Debug setting", action="store_true")
+    parser.add_argument(
+        "--async-engine",
+        help="Run every due mfscli command of every target at once with asyncio, then parse the results",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--chunk-metrics",
+        help="Also export chunk replication health from mfscli -SIC",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--chunk-timeout",
+        help="Seconds to wait for the chunk matrix before giving up",
+        type=float,
+        default=30,
+    )
+    parser.add_argument(
+        "--chunkserver-timeout",
+        help="Seconds to wait for the chunkserver listing before giving up",
+        type=float,
+        default=30,
+    )
+    parser.add_argument(
+        "--disk-metrics",
+        help="Also export per-disk metrics from mfscli -SHD",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--disk-timeout",
+        help="Seconds to wait for the disk listing before giving up",
+        type=float,
+        default=60,
+    )
+    parser.add_argument(
+        "--jitter",
+        help="Randomly lengthen or shorten each refresh interval by up to this fraction",
+        type=float,
+        default=0.1,
+    )
     parser.add_argument(
         "-l",
         "--log-level",
@@ -27,7 +86,37 @@ def parse_master_cli():
         default=9877,
     )
     parser.add_argument(
-        "--master-port", help="Port on moosefs master", type=int, default=9421
+        "--master-port", help="Port on moosefs master", type=int, default=DEFAULT_MASTER_PORT
+    )
+    parser.add_argument(
+        "--master-timeout",
+        help="Seconds to wait for master status before giving up",
+        type=float,
+        default=10,
+    )
+    parser.add_argument(
+        "--max-backoff",
+        help="Longest wait in seconds between retries of a failing master",
+        type=int,
+        default=300,
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        help="Maximum number of mfscli commands the async engine runs at the same time",
+        type=int,
+        default=16,
+    )
+    parser.add_argument(
+        "--max-probe-targets",
+        help="Most targets that were only ever probed to keep polling state for",
+        type=int,
+        default=32,
+    )
+    parser.add_argument(
+        "--max-workers",
+        help="Maximum number of masters to poll at the same time",
+        type=int,
+        default=8,
     )
     parser.add_argument(
         "--moosefs-master",
@@ -35,10 +124,138 @@ def parse_master_cli():
         type=str,
         default="localhost",
     )
+    parser.add_argument(
+        "--mount-metrics",
+        help="Also export client session and mount operation metrics from mfscli -SMS and -SMO",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--mount-timeout",
+        help="Seconds to wait for each mount listing before giving up",
+        type=float,
+        default=30,
+    )
+    parser.add_argument(
+        "--mount-top-k",
+        help="Export this many of the busiest mounts individually and sum up the rest",
+        type=int,
+        default=50,
+    )
+    parser.add_argument(
+        "--native-protocol",
+        help="Talk to the master directly instead of running mfscli",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--no-http",
+        help="Don't serve metrics over HTTP, only write them to --textfile or --push-gateway",
+        action="store_true",
+    )
     parser.add_argument(
         "--polling-interval", help="Polling interval in seconds", type=int, default=15
     )
+    parser.add_argument(
+        "--probe-allow",
+        help="Let /probe poll unconfigured targets whose host:port matches this glob, e.g. '*.mfs.example.com:9421'. Can be repeated",
+        metavar="PATTERN",
+        action="append",
+    )
+    parser.add_argument(
+        "--push-gateway",
+        help="Also push metrics to this Pushgateway after every poll",
+        metavar="URL",
+        type=str,
+    )
+    parser.add_argument(
+        "--push-job",
+        help="Job name to push metrics to the Pushgateway under",
+        type=str,
+        default="moosefs_tricorder",
+    )
+    parser.add_argument(
+        "--record",
+        help="Append the raw output of every mfscli run to a compressed log in this directory",
+        metavar="DIR",
+        type=str,
+    )
+    parser.add_argument(
+        "--replay",
+        help="Serve mfscli output recorded with --record from this directory instead of running mfscli",
+        metavar="DIR",
+        type=str,
+    )
+    parser.add_argument(
+        "--replay-speed",
+        help="How many times faster than real time to replay a recording",
+        type=float,
+        default=1.0,
+    )
+    parser.add_argument(
+        "--section-interval",
+        help=f"Refresh a section every SECONDS instead of every polling interval. Can be repeated. Sections: {', '.join(SECTIONS)}",
+        metavar="SECTION=SECONDS",
+        type=section_interval,
+        action="append",
+    )
+    parser.add_argument(
+        "--shard-count",
+        help="Number of exporter replicas splitting up the chunkservers between them",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--shard-index",
+        help="Which of the --shard-count replicas this is, from 0. Only shard 0 exports master and cluster-wide metrics",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--target",
+        help="moosefs master to poll as host[:port]. Can be repeated, overrides --moosefs-master",
+        action="append",
+    )
+    parser.add_argument(
+        "--targets-file",
+        help="File listing moosefs masters to poll, one host[:port] per line",
+        type=str,
+    )
+    parser.add_argument(
+        "--textfile",
+        help="Also write metrics to this .prom file for node_exporter's textfile collector after every poll",
+        metavar="PATH",
+        type=str,
+    )
+    parser.add_argument(
+        "--trend-samples",
+        help="Polls of disk usage history kept per chunkserver for fill rate estimates",
+        type=int,
+        default=60,
+    )
     cli = parser.parse_args()
+    if cli.record and cli.replay:
+        parser.error("--record and --replay can't be used together")
+    if cli.native_protocol and (cli.record or cli.replay):
+        parser.error("--record and --replay only work with mfscli, not --native-protocol")
+    if cli.no_http and not (cli.textfile or cli.push_gateway):
+        parser.error("--no-http needs --textfile or --push-gateway, or there's nowhere for metrics to go")
+    if cli.shard_count < 1:
+        parser.error("--shard-count must be at least 1")
+    if not 0 <= cli.shard_index < cli.shard_count:
+        parser.error(f"--shard-index must be between 0 and {cli.shard_count - 1}")
+    if cli.max_probe_targets < 1:
+        parser.error("--max-probe-targets must be at least 1")
+    if cli.max_concurrency < 1:
+        parser.error("--max-concurrency must be at least 1")
+    if cli.mount_top_k < 1:
+        parser.error("--mount-top-k must be at least 1")
+    if cli.trend_samples < 2:
+        parser.error("--trend-samples must be at least 2")
+    if cli.replay_speed <= 0:
+        parser.error("--replay-speed must be positive")
+    if cli.polling_interval <= 0:
+        parser.error("--polling-interval must be positive")
+    if not 0 <= cli.jitter < 1:
+        parser.error("--jitter must be at least 0 and less than 1")
 
     loglevel = getattr(logging, cli.log_level.upper(), None)
     logFormat = "[%(asctime)s][%(levelname)8s][%(filename)s:%(lineno)s - %(funcName)20s() ] %(message)s"
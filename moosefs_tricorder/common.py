@@ -2,87 +2,699 @@
 
 import logging
 import subprocess
+import threading
 import time
+from array import array
+from contextlib import contextmanager
+from itertools import compress
 from operator import itemgetter
 
+from moosefs_tricorder.instrumentation import (
+    BAD_LINES,
+    COMMAND_DURATION,
+    COMMAND_TIMEOUTS,
+    PARSE_DURATION,
+)
+from moosefs_tricorder.topk import TopK
 
-def run(command: str):
+# The parts of a master's state we poll, each with its own mfscli command
+SECTIONS = ("master", "chunkservers", "chunks", "disks", "mounts")
+
+# The mfscli arguments for each section's commands
+MFSCLI_ARGS = {
+    "master": (("-SIM", "-s_"),),
+    "chunkservers": (("-SCS", "-s^"),),
+    "chunks": (("-SIC", "-s^"),),
+    "disks": (("-SHD", "-s^"),),
+    "mounts": (("-SMS", "-s^"), ("-SMO", "-s^")),
+}
+
+# Seconds to let each section's mfscli run before killing it
+DEFAULT_TIMEOUTS = {"master": 10, "chunkservers": 30, "chunks": 30, "disks": 60, "mounts": 30}
+
+# Set by --record and --replay to a moosefs_tricorder.recording Recorder
+# or Replayer. A Replayer answers for mfscli instead of running it.
+RECORDER = None
+REPLAYER = None
+
+# Output already fetched for this thread, see prefetched()
+_prefetched = threading.local()
+
+
+class CommandTimeout(Exception):
+    """
+    A command took longer than its timeout and was killed
+    """
+
+
+class InvalidTarget(ValueError):
+    """
+    A target isn't a valid host[:port]
+    """
+
+
+class TargetNotAllowed(Exception):
+    """
+    A probe asked for a target that isn't configured or allowed
+    """
+
+
+def mfscli(moosefs_master: str, moosefs_master_port: int, *args: str) -> list:
+    """
+    Build an mfscli command line.
+
+    Commands are run without a shell, so nothing in a target's name can be
+    interpreted by one and a timeout kills mfscli itself rather than a shell
+    that leaves it running.
+    """
+    return ["mfscli", "-H", moosefs_master, "-P", str(moosefs_master_port), *args]
+
+
+def section_commands(moosefs_master: str, moosefs_master_port: int, section: str) -> list:
+    """
+    The mfscli command lines a section runs
+    """
+    return [mfscli(moosefs_master, moosefs_master_port, *args) for args in MFSCLI_ARGS[section]]
+
+
+@contextmanager
+def prefetched(outputs: dict):
+    """
+    Have run() and stream() in this thread answer with output that was
+    already fetched, keyed by tuple(command), instead of running commands.
+    An exception in place of output is raised instead.
+    """
+    _prefetched.outputs = outputs
+    try:
+        yield
+    finally:
+        _prefetched.outputs = None
+
+
+def prefetched_output(command: list) -> bytes:
+    """
+    Output prefetched for command in this thread, or None
+    """
+    outputs = getattr(_prefetched, "outputs", None)
+    if not outputs:
+        return None
+    output = outputs.get(tuple(command))
+    if isinstance(output, BaseException):
+        raise output
+    return output
+
+
+def run(command: list, section: str = "other", timeout: float = None):
     """
     Run a command an return its output
     """
-    logging.debug(f"Running {command}...")
-    cmd = subprocess.Popen(command, stdout=subprocess.PIPE, shell=True)
-    (output, err) = cmd.communicate()
+    if REPLAYER is not None:
+        return (REPLAYER.output(command), None)
+    output = prefetched_output(command)
+    if output is not None:
+        return (output, None)
+    logging.debug(f"Running {' '.join(command)}...")
+    started = time.perf_counter()
+    cmd = subprocess.Popen(command, stdout=subprocess.PIPE)
+    try:
+        (output, err) = cmd.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        cmd.kill()
+        cmd.communicate()
+        COMMAND_TIMEOUTS.labels(section).inc()
+        err_msg = f"{' '.join(command)} killed after {timeout}s"
+        logging.error(err_msg)
+        raise CommandTimeout(err_msg)
+    finally:
+        COMMAND_DURATION.labels(section).observe(time.perf_counter() - started)
 
     # Wait for it to terminate
     cmd_status = cmd.wait()
     if cmd_status != 0:
-        err_msg = f"{command} exited {cmd_status}. \noutput={output}\nerr={err}"
+        err_msg = f"{' '.join(command)} exited {cmd_status}. \noutput={output}\nerr={err}"
         logging.error(err_msg)
         raise Exception(err_msg)
+    if RECORDER is not None:
+        RECORDER.record(command, section, output)
     return (output, err)
 
 
-def load_chunkserver_metrics(moosefs_master: str, moosefs_master_port: int) -> dict:
+def stream(command: list, section: str = "other", timeout: float = None):
+    """
+    Run a command and yield its output one line at a time, so callers never
+    hold more than a line of it in memory.
+
+    Time the caller spends with each line is recorded as parse time, the
+    rest as time spent waiting on the command. If the command is still
+    running after timeout seconds it is killed.
+    """
+    output = REPLAYER.output(command) if REPLAYER is not None else prefetched_output(command)
+    if output is not None:
+        started = time.perf_counter()
+        yield from output.splitlines(keepends=True)
+        PARSE_DURATION.labels(section).observe(time.perf_counter() - started)
+        return
+    logging.debug(f"Streaming {' '.join(command)}...")
+    started = time.perf_counter()
+    parsing = 0.0
+    perf_counter = time.perf_counter
+    cmd = subprocess.Popen(command, stdout=subprocess.PIPE)
+    # Killing the child closes its end of the pipe, which ends the loop
+    # below wherever it is blocked
+    timed_out = threading.Event()
+    killer = None
+    if timeout is not None:
+        killer = threading.Timer(timeout, lambda: (timed_out.set(), cmd.kill()))
+        killer.daemon = True
+        killer.start()
+    # Recording has to keep the whole output until we know mfscli succeeded
+    recorded = [] if RECORDER is not None else None
+    finished = False
+    try:
+        for line in cmd.stdout:
+            if recorded is not None:
+                recorded.append(line)
+            handed_off = perf_counter()
+            yield line
+            parsing += perf_counter() - handed_off
+        finished = True
+    finally:
+        cmd.stdout.close()
+        if not finished:
+            # The caller gave up on us early
+            cmd.kill()
+        cmd_status = cmd.wait()
+        if killer is not None:
+            killer.cancel()
+        COMMAND_DURATION.labels(section).observe(time.perf_counter() - started - parsing)
+        PARSE_DURATION.labels(section).observe(parsing)
+    if timed_out.is_set():
+        COMMAND_TIMEOUTS.labels(section).inc()
+        err_msg = f"{' '.join(command)} killed after {timeout}s"
+        logging.error(err_msg)
+        raise CommandTimeout(err_msg)
+    if cmd_status != 0:
+        err_msg = f"{' '.join(command)} exited {cmd_status}."
+        logging.error(err_msg)
+        raise Exception(err_msg)
+    if recorded is not None:
+        RECORDER.record(command, section, b"".join(recorded))
+
+
+class Chunkserver:
+    """
+    One chunkserver from mfscli -SCS
+    """
+
+    __slots__ = (
+        "name",
+        "port",
+        "cs_id",
+        "labels",
+        "version",
+        "load",
+        "maintenance",
+        "chunk_count",
+        "disk_used",
+        "disk_total",
+    )
+
+    def __init__(self, name, port, cs_id, labels, version, load, maintenance, chunk_count, disk_used, disk_total):
+        self.name = name
+        self.port = port
+        self.cs_id = cs_id
+        self.labels = labels
+        self.version = version
+        self.load = load
+        self.maintenance = maintenance
+        self.chunk_count = chunk_count
+        self.disk_used = disk_used
+        self.disk_total = disk_total
+
+    @property
+    def disk_usage(self) -> float:
+        if not self.disk_total:
+            return 0.0
+        return self.disk_used / self.disk_total
+
+    @property
+    def in_maintenance(self) -> bool:
+        return self.maintenance != "maintenance_off"
+
+    def __repr__(self):
+        fields = ", ".join(f"{slot}={getattr(self, slot)!r}" for slot in self.__slots__)
+        return f"Chunkserver({fields})"
+
+
+class ChunkserverListing:
+    """
+    Chunkservers keyed by name, plus the cluster totals accumulated while
+    they were parsed
+    """
+
+    __slots__ = (
+        "chunkservers",
+        "chunk_count",
+        "disk_total",
+        "disk_used",
+        "maintenance_count",
+    )
+
+    def __init__(self):
+        self.chunkservers = {}
+        self.chunk_count = 0
+        self.disk_total = 0
+        self.disk_used = 0
+        self.maintenance_count = 0
+
+    def add(self, chunkserver: Chunkserver):
+        previous = self.chunkservers.get(chunkserver.name)
+        if previous is not None:
+            # mfscli shouldn't list a chunkserver twice, but keep the
+            # totals honest if it does
+            self._account(previous, -1)
+        self.chunkservers[chunkserver.name] = chunkserver
+        self._account(chunkserver, 1)
+
+    def _account(self, chunkserver: Chunkserver, sign: int):
+        self.chunk_count += sign * chunkserver.chunk_count
+        self.disk_total += sign * chunkserver.disk_total
+        self.disk_used += sign * chunkserver.disk_used
+        if chunkserver.in_maintenance:
+            self.maintenance_count += sign
+
+    @property
+    def chunkserver_count(self) -> int:
+        return len(self.chunkservers)
+
+    @property
+    def disk_usage(self) -> float:
+        if not self.disk_total:
+            return 0.0
+        return self.disk_used / self.disk_total
+
+
+def parse_chunkserver_line(line: str) -> Chunkserver:
+    """
+    Parse one ^-separated line of mfscli -SCS output
+    """
+    (
+        chunkserver,
+        port,
+        cs_id,
+        labels,
+        version,
+        load,
+        maintenance,
+        chunk_count,
+        disk_used,
+        disk_total,
+    ) = itemgetter(1, 2, 3, 4, 5, 6, 7, 8, 9, 10)(line.split("^"))
+    return Chunkserver(
+        chunkserver,
+        int(port),
+        int(cs_id),
+        labels,
+        version,
+        int(load),
+        maintenance,
+        int(chunk_count),
+        int(disk_used),
+        int(disk_total),
+    )
+
+
+def parse_chunkserver_lines(lines) -> ChunkserverListing:
+    """
+    Parse mfscli -SCS output in a single pass, accepting str or bytes lines
+    """
+    data = ChunkserverListing()
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode()
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            chunkserver = parse_chunkserver_line(line)
+        except Exception as e:
+            BAD_LINES.labels("chunkservers").inc()
+            logging.error(f"Bad line: {line}")
+            logging.error(f"chunks: {line.split('^')}")
+            logging.error(e)
+            continue
+        data.add(chunkserver)
+        logging.debug(f"{chunkserver.name}: {chunkserver}")
+    return data
+
+
+def load_chunkserver_metrics(
+    moosefs_master: str, moosefs_master_port: int, timeout: float = DEFAULT_TIMEOUTS["chunkservers"]
+) -> ChunkserverListing:
     """
     Load chunkserver metrics
     """
     logging.info("Loading chunkserver metrics...")
-    command = f"mfscli -H {moosefs_master} -P {moosefs_master_port} -SCS -s^"
-    stderr, _ = run(command)
-    output = stderr.decode().split("\n")
-    logging.debug(f"output: {output}")
-    data = {}
-    for line in output:
+    (command,) = section_commands(moosefs_master, moosefs_master_port, "chunkservers")
+    return parse_chunkserver_lines(stream(command, section="chunkservers", timeout=timeout))
+
+
+class Disk:
+    """
+    One chunkserver disk from mfscli -SHD
+    """
+
+    __slots__ = (
+        "chunkserver",
+        "port",
+        "path",
+        "chunk_count",
+        "error_count",
+        "last_error",
+        "status",
+        "read_bytes_per_second",
+        "write_bytes_per_second",
+        "read_latency",
+        "write_latency",
+        "fsync_latency",
+        "read_ops",
+        "write_ops",
+        "fsync_ops",
+        "used",
+        "total",
+    )
+
+    def __init__(self, *values):
+        for slot, value in zip(self.__slots__, values):
+            setattr(self, slot, value)
+
+    @property
+    def usage(self) -> float:
+        if not self.total:
+            return 0.0
+        return self.used / self.total
+
+    @property
+    def damaged(self) -> bool:
+        return "damaged" in self.status
+
+    def __repr__(self):
+        fields = ", ".join(f"{slot}={getattr(self, slot)!r}" for slot in self.__slots__)
+        return f"Disk({fields})"
+
+
+def parse_disk_line(line: str) -> Disk:
+    """
+    Parse one ^-separated line of mfscli -SHD output.
+
+    The columns we use are ip:port:path, chunks, error count, last error
+    time, status, read and write bytes/s, average read, write and fsync
+    latency in microseconds, read, write and fsync operation counts, used
+    and total bytes.
+    """
+    (
+        location,
+        chunk_count,
+        error_count,
+        last_error,
+        status,
+        read_bytes,
+        write_bytes,
+        read_usec,
+        write_usec,
+        fsync_usec,
+        read_ops,
+        write_ops,
+        fsync_ops,
+        used,
+        total,
+    ) = itemgetter(1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15)(line.split("^"))
+    chunkserver, port, path = location.split(":", 2)
+    return Disk(
+        chunkserver,
+        int(port),
+        path,
+        int(chunk_count),
+        int(error_count),
+        int(last_error) if last_error.isdigit() else 0,
+        status,
+        float(read_bytes),
+        float(write_bytes),
+        float(read_usec) / 1000000,
+        float(write_usec) / 1000000,
+        float(fsync_usec) / 1000000,
+        int(read_ops),
+        int(write_ops),
+        int(fsync_ops),
+        int(used),
+        int(total),
+    )
+
+
+def parse_disk_lines(lines) -> list:
+    """
+    Parse mfscli -SHD output in a single pass, accepting str or bytes lines
+    """
+    disks = []
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode()
+        line = line.strip()
         if not line:
             continue
         try:
-            chunks = line.strip().split("^")
-            (
-                chunkserver,
-                port,
-                cs_id,
-                labels,
-                version,
-                load,
-                maintenance,
-                chunk_count,
-                disk_used,
-                disk_total,
-            ) = itemgetter(1, 2, 3, 4, 5, 6, 7, 8, 9, 10)(chunks)
-            data[chunkserver] = {}
-            data[chunkserver]["port"] = int(port)
-            data[chunkserver]["cs_id"] = int(cs_id)
-            data[chunkserver]["labels"] = labels
-            data[chunkserver]["version"] = version
-            data[chunkserver]["load"] = int(load)
-            data[chunkserver]["maintenance"] = maintenance
-            data[chunkserver]["chunk_count"] = int(chunk_count)
-            data[chunkserver]["disk_used"] = int(disk_used)
-            data[chunkserver]["disk_total"] = int(disk_total)
-            data[chunkserver]["disk_usage"] = int(disk_used) / int(disk_total)
-            logging.debug(f"{chunkserver}: {data[chunkserver]}")
+            disks.append(parse_disk_line(line))
         except Exception as e:
+            BAD_LINES.labels("disks").inc()
             logging.error(f"Bad line: {line}")
-            logging.error(f"chunks: {line.strip().split('^')}")
             logging.error(e)
-    logging.debug(f"data: {data}")
-    return data
+    return disks
 
 
-def load_master_metrics(moosefs_master: str, moosefs_master_port: int) -> dict:
+def load_disk_metrics(moosefs_master: str, moosefs_master_port: int, timeout: float = DEFAULT_TIMEOUTS["disks"]) -> list:
     """
-    Load master metrics
+    Load per-disk metrics for every chunkserver
+    """
+    logging.info("Loading disk metrics...")
+    (command,) = section_commands(moosefs_master, moosefs_master_port, "disks")
+    return parse_disk_lines(stream(command, section="disks", timeout=timeout))
+
+
+# The chunk matrix has a row per goal and a column per number of valid
+# copies, 0 through 9 and then 10 or more
+MATRIX_SIZE = 11
+MATRIX_CELLS = MATRIX_SIZE * MATRIX_SIZE
+EMPTY_MATRIX = array("q", [0]) * MATRIX_CELLS
+
+
+def _matrix_mask(predicate) -> tuple:
+    return tuple(predicate(goal, copies) for goal in range(MATRIX_SIZE) for copies in range(MATRIX_SIZE))
+
+
+# Which cells of a matrix count towards each chunk state. Chunks with a
+# goal of 0 are waiting to be deleted, so any copies they still have are
+# overgoal.
+CHUNK_STATES = {
+    "missing": _matrix_mask(lambda goal, copies: goal > 0 and copies == 0),
+    "endangered": _matrix_mask(lambda goal, copies: goal > 1 and copies == 1),
+    "undergoal": _matrix_mask(lambda goal, copies: 0 < copies < goal),
+    "stable": _matrix_mask(lambda goal, copies: goal > 0 and copies == goal),
+    "overgoal": _matrix_mask(lambda goal, copies: copies > goal),
+}
+
+
+class ChunkMatrix:
+    """
+    Chunk counts by goal and valid copies for each storage class, kept in
+    one flat array of MATRIX_CELLS counts per class
+    """
+
+    __slots__ = ("offsets", "cells")
+
+    def __init__(self):
+        # Storage class name -> where its matrix starts in cells
+        self.offsets = {}
+        self.cells = array("q")
+
+    def set_row(self, storage_class: str, goal: int, counts: array):
+        offset = self.offsets.get(storage_class)
+        if offset is None:
+            offset = self.offsets[storage_class] = len(self.cells)
+            self.cells.extend(EMPTY_MATRIX)
+        start = offset + goal * MATRIX_SIZE
+        self.cells[start : start + MATRIX_SIZE] = counts
+
+    def states(self) -> dict:
+        """
+        Chunk counts per state for each storage class, e.g.
+        {"default": {"missing": 0, "endangered": 3, ...}}
+
+        Each count is a masked sum over a slice of the array, so the work
+        happens in C rather than in a loop over every cell.
+        """
+        cells = self.cells
+        return {
+            storage_class: {
+                state: sum(compress(cells[offset : offset + MATRIX_CELLS], mask))
+                for state, mask in CHUNK_STATES.items()
+            }
+            for storage_class, offset in self.offsets.items()
+        }
+
+
+def parse_chunk_matrix_line(line: str) -> tuple:
+    """
+    Parse one ^-separated row of mfscli -SIC output.
+
+    The columns we use are the storage class, the goal (0-9 or "10+") and
+    the number of chunks with 0 through 10+ valid copies.
+    """
+    fields = line.split("^")
+    storage_class = fields[1]
+    goal = fields[2]
+    counts = array("q", map(int, fields[3 : 3 + MATRIX_SIZE]))
+    if len(counts) != MATRIX_SIZE:
+        raise ValueError(f"expected {MATRIX_SIZE} copy counts, got {len(counts)}")
+    goal = MATRIX_SIZE - 1 if goal.endswith("+") else int(goal)
+    if not 0 <= goal < MATRIX_SIZE:
+        raise ValueError(f"goal {goal} out of range")
+    return (storage_class, goal, counts)
+
+
+def parse_chunk_matrix_lines(lines) -> ChunkMatrix:
+    """
+    Parse mfscli -SIC output in a single pass, accepting str or bytes lines
+    """
+    matrix = ChunkMatrix()
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode()
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            matrix.set_row(*parse_chunk_matrix_line(line))
+        except Exception as e:
+            BAD_LINES.labels("chunks").inc()
+            logging.error(f"Bad line: {line}")
+            logging.error(e)
+    return matrix
+
+
+def load_chunk_metrics(moosefs_master: str, moosefs_master_port: int, timeout: float = DEFAULT_TIMEOUTS["chunks"]) -> ChunkMatrix:
+    """
+    Load the chunk health matrix
+    """
+    logging.info("Loading chunk metrics...")
+    (command,) = section_commands(moosefs_master, moosefs_master_port, "chunks")
+    return parse_chunk_matrix_lines(stream(command, section="chunks", timeout=timeout))
+
+
+# Operation counters in mfscli -SMO output, in column order
+MOUNT_OPERATIONS = (
+    "statfs",
+    "getattr",
+    "setattr",
+    "lookup",
+    "mkdir",
+    "rmdir",
+    "symlink",
+    "readlink",
+    "mknod",
+    "unlink",
+    "rename",
+    "link",
+    "readdir",
+    "open",
+    "read",
+    "write",
+)
+
+
+def parse_mount_lines(lines, top_k: int, parse_line) -> TopK:
+    """
+    Parse mfscli mount listing output into a TopK, accepting str or bytes
+    lines. parse_line turns a line into a key, a weight and a tuple of
+    values.
+
+    A client can have several sessions on the same mount point, which would
+    export identical label sets, so the TopK sums rows with the same key
+    before picking the heaviest, and its count is of rows, i.e. sessions.
+    """
+    mounts = TopK(top_k)
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode()
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            key, weight, values = parse_line(line)
+        except Exception as e:
+            BAD_LINES.labels("mounts").inc()
+            logging.error(f"Bad line: {line}")
+            logging.error(e)
+            continue
+        mounts.add(key, weight, values)
+    return mounts
+
+
+def parse_session_line(line: str) -> tuple:
+    """
+    Parse one ^-separated line of mfscli -SMS output.
+
+    The columns we use are the client's ip, its mount point and how many
+    files it has open. Sessions are weighed by open files.
+    """
+    ip, mount_point, open_files = itemgetter(2, 3, 4)(line.split("^"))
+    open_files = int(open_files)
+    return ((ip, mount_point), open_files, (open_files,))
+
+
+def parse_mount_operations_line(line: str) -> tuple:
+    """
+    Parse one ^-separated line of mfscli -SMO output.
+
+    The columns we use are the client's ip, its mount point and then a
+    counter for each of MOUNT_OPERATIONS. Mounts are weighed by their total
+    operations.
+    """
+    fields = line.split("^")
+    counters = tuple(map(int, fields[3 : 3 + len(MOUNT_OPERATIONS)]))
+    if len(counters) != len(MOUNT_OPERATIONS):
+        raise ValueError(f"expected {len(MOUNT_OPERATIONS)} operation counters, got {len(counters)}")
+    return ((fields[1], fields[2]), sum(counters), counters)
+
+
+def load_mount_metrics(
+    moosefs_master: str, moosefs_master_port: int, top_k: int, timeout: float = DEFAULT_TIMEOUTS["mounts"]
+) -> tuple:
+    """
+    Load the busiest top_k client sessions and the top_k mounts doing the
+    most operations, with everything else summed up
+    """
+    logging.info("Loading mount metrics...")
+    session_command, operations_command = section_commands(moosefs_master, moosefs_master_port, "mounts")
+    sessions = parse_mount_lines(
+        stream(session_command, section="mounts", timeout=timeout),
+        top_k,
+        parse_session_line,
+    )
+    operations = parse_mount_lines(
+        stream(operations_command, section="mounts", timeout=timeout),
+        top_k,
+        parse_mount_operations_line,
+    )
+    return (sessions, operations)
+
+
+def parse_master_output(output: bytes, moosefs_master: str) -> dict:
+    """
+    Parse mfscli -SIM -s_ output
     """
-    logging.info(f"Loading metrics for master node {moosefs_master}:{moosefs_master_port}...")
-    command = f"mfscli -H {moosefs_master} -P {moosefs_master_port} -SIM -s_"
-    logging.debug(f"Running {command}")
-    output, err = run(command)
-    logging.debug(f"output: {output}")
     chunks = output.decode().strip().split("_")
     logging.debug(f"split: {chunks}")
     logging.debug(f"split: {len(chunks)}")
-    logging.debug(f"err: {err}")
     (
         ip,
         version,
@@ -120,5 +732,25 @@ def load_master_metrics(moosefs_master: str, moosefs_master_port: int) -> dict:
     metrics["sys_cpu"] = float(sys_cpu)
     metrics["user_cpu"] = float(user_cpu)
     metrics["version"] = version
+    return metrics
+
+
+def load_master_metrics(moosefs_master: str, moosefs_master_port: int, timeout: float = DEFAULT_TIMEOUTS["master"]) -> dict:
+    """
+    Load master metrics
+    """
+    logging.info(f"Loading metrics for master node {moosefs_master}:{moosefs_master_port}...")
+    (command,) = section_commands(moosefs_master, moosefs_master_port, "master")
+    output, err = run(command, section="master", timeout=timeout)
+    logging.debug(f"output: {output}")
+    logging.debug(f"err: {err}")
+    parse_started = time.perf_counter()
+    try:
+        metrics = parse_master_output(output, moosefs_master)
+    except Exception:
+        BAD_LINES.labels("master").inc()
+        logging.error(f"Bad line: {output}")
+        raise
+    PARSE_DURATION.labels("master").observe(time.perf_counter() - parse_started)
     logging.debug(metrics)
     return metrics
@@ -0,0 +1,89 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+"""
+Run every mfscli command a poll needs at once with asyncio.
+
+Left to themselves, MooseCollectors run their sections' commands one after
+another, so a poll takes as long as all of them put together. The engine
+starts all of them - every due section of every target - as asyncio
+subprocesses up front, at most max_concurrency at a time, and the
+collectors then parse the output it fetched. A poll takes as long as its
+slowest command.
+
+Output is fetched whole rather than streamed, so a poll briefly holds all
+of it in memory.
+"""
+
+import asyncio
+import logging
+import time
+
+from moosefs_tricorder import common
+from moosefs_tricorder.common import CommandTimeout
+from moosefs_tricorder.instrumentation import COMMAND_DURATION, COMMAND_TIMEOUTS
+
+DEFAULT_CONCURRENCY = 16
+
+
+class AsyncEngine:
+    """
+    Fetches the output of many commands concurrently
+    """
+
+    def __init__(self, max_concurrency: int = DEFAULT_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+
+    def fetch(self, commands: list) -> dict:
+        """
+        Run (command, section, timeout) commands and return their output
+        keyed by tuple(command), or the exception a command failed with
+        """
+        if not commands or common.REPLAYER is not None:
+            return {}
+        started = time.perf_counter()
+        outputs = asyncio.run(self._fetch_all(commands))
+        logging.debug(f"fetched {len(commands)} commands in {time.perf_counter() - started:.3f}s")
+        return outputs
+
+    async def _fetch_all(self, commands: list) -> dict:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(
+            *(self._fetch(semaphore, command, section, timeout) for command, section, timeout in commands),
+            return_exceptions=True,
+        )
+        return {tuple(command): result for (command, _, _), result in zip(commands, results)}
+
+    async def _fetch(self, semaphore: asyncio.Semaphore, command: list, section: str, timeout: float) -> bytes:
+        async with semaphore:
+            logging.debug(f"Running {' '.join(command)}...")
+            started = time.perf_counter()
+            process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE)
+            try:
+                output, _ = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                await self._kill(process)
+                COMMAND_TIMEOUTS.labels(section).inc()
+                err_msg = f"{' '.join(command)} killed after {timeout}s"
+                logging.error(err_msg)
+                raise CommandTimeout(err_msg)
+            except asyncio.CancelledError:
+                await self._kill(process)
+                raise
+            finally:
+                COMMAND_DURATION.labels(section).observe(time.perf_counter() - started)
+
+        if process.returncode != 0:
+            err_msg = f"{' '.join(command)} exited {process.returncode}."
+            logging.error(err_msg)
+            raise Exception(err_msg)
+        if common.RECORDER is not None:
+            common.RECORDER.record(command, section, output)
+        return output
+
+    @staticmethod
+    async def _kill(process):
+        """
+        Kill a process and reap it, so cancelled commands don't linger
+        """
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
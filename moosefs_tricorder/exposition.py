@@ -0,0 +1,215 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+#
+# pyright: ignore reportMissingImports
+"""
+Render a registry once per poll and serve the bytes to every scrape.
+
+Scrapes only ever see snapshots that change once per polling interval, so
+there is no point serializing and gzipping them again for every request.
+"""
+
+import hashlib
+import logging
+import time
+import zlib
+from email.utils import formatdate, parsedate_to_datetime
+
+from prometheus_client.exposition import (  # pylint: disable=import-error
+    CONTENT_TYPE_LATEST,
+    generate_latest,
+)
+from prometheus_client.openmetrics.exposition import (  # pylint: disable=import-error
+    CONTENT_TYPE_LATEST as OPENMETRICS_CONTENT_TYPE,
+)
+from prometheus_client.openmetrics.exposition import (  # pylint: disable=import-error
+    generate_latest as generate_openmetrics,
+)
+
+from moosefs_tricorder.instrumentation import RENDER_DURATION
+from moosefs_tricorder.singleflight import SingleFlight
+
+GZIP_LEVEL = 6
+RENDERS = SingleFlight("render")
+OPENMETRICS_EOF = b"# EOF\n"
+
+
+class Snapshot:
+    """
+    The metrics a registry held at one moment, which can be rendered later
+    without seeing anything the registry collected since
+    """
+
+    __slots__ = ("metrics",)
+
+    def __init__(self, registry):
+        self.metrics = list(registry.collect())
+
+    def collect(self):
+        return iter(self.metrics)
+
+
+class RenderedExposition:
+    """
+    One snapshot of a registry, rendered in each exposition format, plain
+    and gzipped, the first time it's asked for in that form.
+
+    Most deployments only ever ask for one or two of the four, so the rest
+    are never rendered. The OpenMetrics body is kept without its closing
+    "# EOF" so more metrics can be appended to it when it is served.
+    """
+
+    __slots__ = (
+        "snapshot",
+        "etag",
+        "last_modified",
+        "last_modified_timestamp",
+        "_bodies",
+    )
+
+    def __init__(self, snapshot: Snapshot, timestamp: float):
+        self.snapshot = snapshot
+        # The bodies aren't rendered yet, so the tag identifies the
+        # snapshot rather than its content
+        self.etag = hashlib.blake2b(repr((id(snapshot), timestamp)).encode(), digest_size=12).hexdigest()
+        self.last_modified = formatdate(timestamp, usegmt=True)
+        # HTTP dates only have one second resolution
+        self.last_modified_timestamp = int(timestamp)
+        # (openmetrics, gzipped) -> plain body or open_gzip() result
+        self._bodies = {}
+
+    def _get(self, openmetrics: bool, gzipped: bool):
+        variant = (openmetrics, gzipped)
+        body = self._bodies.get(variant)
+        if body is None:
+            # Scrapes arriving while it renders wait for that rendering
+            body = RENDERS.do((id(self), variant), self._render, openmetrics, gzipped)
+        return body
+
+    def _render(self, openmetrics: bool, gzipped: bool):
+        variant = (openmetrics, gzipped)
+        body = self._bodies.get(variant)
+        if body is not None:
+            return body
+        if gzipped:
+            body = open_gzip(self._get(openmetrics, False))
+        else:
+            started = time.perf_counter()
+            if openmetrics:
+                body = generate_openmetrics(self.snapshot).removesuffix(OPENMETRICS_EOF)
+            else:
+                body = generate_latest(self.snapshot)
+            elapsed = time.perf_counter() - started
+            RENDER_DURATION.observe(elapsed)
+            logging.debug(f"rendered {len(body)} bytes of {'OpenMetrics' if openmetrics else 'text'} in {elapsed:.3f}s")
+        self._bodies[variant] = body
+        return body
+
+    def body(self, openmetrics: bool, gzipped: bool, live: bytes = b"") -> bytes:
+        """
+        The cached body for a representation with live appended to it
+        """
+        if gzipped:
+            prefix, compressor = self._get(openmetrics, True)
+            # Carry on from where the cached stream left off, so the result
+            # is one gzip member that every client can decode
+            compressor = compressor.copy()
+            return prefix + compressor.compress(live) + compressor.flush()
+        return self._get(openmetrics, False) + live
+
+    def entity_tag(self, openmetrics: bool, gzipped: bool) -> str:
+        """
+        Each of the four bodies is a different representation, so each gets
+        its own tag
+        """
+        variant = ("-om" if openmetrics else "") + ("-gz" if gzipped else "")
+        return f'"{self.etag}{variant}"'
+
+    def not_modified(self, environ, etag: str) -> bool:
+        """
+        Check the request's conditional headers against this rendering
+        """
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags or f"W/{etag}" in tags
+        if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return self.last_modified_timestamp <= since
+        return False
+
+
+def open_gzip(data: bytes) -> tuple:
+    """
+    Gzip data without finishing the stream.
+
+    Returns the compressed bytes so far and the compressor, which can be
+    copied to append more data and close the stream later.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return (compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH), compressor)
+
+
+def render(registry) -> RenderedExposition:
+    """
+    Take a snapshot of a registry to be rendered in whichever formats are
+    asked for
+    """
+    return RenderedExposition(Snapshot(registry), timestamp=time.time())
+
+
+class ExpositionCache:
+    """
+    Renders a registry at most once per version of its data.
+
+    Callers pass whatever identifies the current snapshot (a refresh time,
+    a generation counter); the registry is only collected again when that
+    changes, and each format is rendered from that collection at most once.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        # (version, rendering), swapped as a pair so readers never see a
+        # rendering labelled with the wrong version
+        self._current = (None, None)
+
+    def get(self, version) -> RenderedExposition:
+        current_version, rendered = self._current
+        if rendered is not None and current_version == version:
+            return rendered
+        return RENDERS.do((id(self), version), self._render, version)
+
+    def _render(self, version) -> RenderedExposition:
+        current_version, rendered = self._current
+        if rendered is None or current_version != version:
+            rendered = render(self.registry)
+            self._current = (version, rendered)
+        return rendered
+
+
+def serve(rendered: RenderedExposition, environ, start_response):
+    """
+    Answer a WSGI request from a pre-rendered exposition.
+
+    The body only changes when the snapshot does, so the ETag and
+    Last-Modified stay the same for every scrape in between.
+    """
+    openmetrics = "application/openmetrics-text" in environ.get("HTTP_ACCEPT", "")
+    gzipped = "gzip" in environ.get("HTTP_ACCEPT_ENCODING", "")
+
+    etag = rendered.entity_tag(openmetrics=openmetrics, gzipped=gzipped)
+    headers = [("ETag", etag), ("Last-Modified", rendered.last_modified), ("Vary", "Accept, Accept-Encoding")]
+    if rendered.not_modified(environ, etag):
+        start_response("304 Not Modified", headers)
+        return [b""]
+
+    body = rendered.body(openmetrics=openmetrics, gzipped=gzipped, live=OPENMETRICS_EOF if openmetrics else b"")
+    headers.append(("Content-Type", OPENMETRICS_CONTENT_TYPE if openmetrics else CONTENT_TYPE_LATEST))
+    headers.append(("Content-Length", str(len(body))))
+    if gzipped:
+        headers.append(("Content-Encoding", "gzip"))
+    start_response("200 OK", headers)
+    return [body]
@@ -0,0 +1,159 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+"""
+A fake moosefs master that answers the requests MasterClient sends.
+
+Handy for exercising the exporter without a real cluster:
+
+    with FakeMaster(chunkservers=[FakeChunkserver("10.0.1.1")]) as master:
+        client = MasterClient("127.0.0.1", master.port)
+        client.load_chunkserver_metrics()
+"""
+
+import logging
+import socket
+import socketserver
+import threading
+from dataclasses import dataclass, field
+
+from moosefs_tricorder.mfsproto import (
+    CLTOMA_CSERV_LIST,
+    CLTOMA_INFO,
+    CSERV_RECORD,
+    HEADER,
+    INFO_COUNTERS,
+    INFO_HEAD,
+    INFO_TAIL,
+    MATOCL_CSERV_LIST,
+    MATOCL_INFO,
+)
+
+
+@dataclass
+class FakeChunkserver:
+    ip: str
+    port: int = 9422
+    cs_id: int = 1
+    version: tuple = (3, 0, 116)
+    flags: int = 0
+    disk_used: int = 100
+    disk_total: int = 1000
+    chunk_count: int = 10
+    load: int = 0
+    labels: int = 0
+
+    def pack(self) -> bytes:
+        return CSERV_RECORD.pack(
+            self.flags,
+            *self.version,
+            *(int(octet) for octet in self.ip.split(".")),
+            self.port,
+            self.cs_id,
+            self.disk_used,
+            self.disk_total,
+            self.chunk_count,
+            0,
+            0,
+            0,
+            0,
+            self.load,
+            0,
+            self.labels,
+            0,
+        )
+
+
+@dataclass
+class FakeMasterInfo:
+    version: tuple = (3, 0, 116)
+    ram_used: int = 104857600
+    sys_cpu: int = 5000
+    user_cpu: int = 10000
+    last_save: int = 1697000000
+    last_save_duration: int = 1
+    last_save_status: int = 0
+    # Stands in for the space/inode counters we don't decode
+    padding: bytes = field(default=bytes(INFO_COUNTERS.size))
+    # Fields newer masters append after the ones we know about
+    trailer: bytes = b""
+
+    def pack(self) -> bytes:
+        return (
+            INFO_HEAD.pack(*self.version, self.ram_used, self.sys_cpu, self.user_cpu)
+            + self.padding
+            + INFO_TAIL.pack(self.last_save, self.last_save_duration, self.last_save_status)
+            + self.trailer
+        )
+
+
+class _FakeMasterHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        master = self.server.fake_master
+        master.connections.append(self.request)
+        stream = self.request.makefile("rb")
+        while True:
+            header = stream.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            cmd, length = HEADER.unpack(header)
+            stream.read(length)
+            master.requests.append(cmd)
+            if cmd == CLTOMA_INFO:
+                payload = master.info.pack()
+                answer = MATOCL_INFO
+            elif cmd == CLTOMA_CSERV_LIST:
+                payload = b"".join(cs.pack() for cs in master.chunkservers)
+                answer = MATOCL_CSERV_LIST
+            else:
+                logging.warning(f"fake master: unsupported command {cmd}")
+                return
+            self.request.sendall(HEADER.pack(answer, len(payload)) + payload)
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeMaster:
+    """
+    Serve canned stats on a local port until stopped
+    """
+
+    def __init__(self, chunkservers=None, info=None, host: str = "127.0.0.1", port: int = 0):
+        self.chunkservers = list(chunkservers or [])
+        self.info = info or FakeMasterInfo()
+        self.requests = []
+        self.connections = []
+        self._server = _ThreadingTCPServer((host, port), _FakeMasterHandler)
+        self._server.fake_master = self
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def drop_connections(self):
+        """
+        Hang up on every client, like a master restart would
+        """
+        for connection in self.connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.connections = []
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
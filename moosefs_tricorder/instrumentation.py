@@ -0,0 +1,115 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+#
+# pyright: ignore reportMissingImports
+"""
+Metrics about the exporter itself.
+
+These live in their own registry, served on /exporter-metrics. The
+moosefs metrics are rendered once per poll, but these are cheap and
+rendered fresh for every scrape so that snapshot ages are current.
+"""
+
+import time
+
+from prometheus_client import Counter, Gauge, Histogram  # pylint: disable=import-error
+from prometheus_client.core import (  # pylint: disable=import-error
+    CollectorRegistry,
+    GaugeMetricFamily,
+)
+from prometheus_client.registry import Collector  # pylint: disable=import-error
+
+EXPORTER_REGISTRY = CollectorRegistry(auto_describe=True)
+
+# mfscli startup alone is a couple of hundred milliseconds, and a master
+# busy saving metadata can take tens of seconds to answer
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+COMMAND_DURATION = Histogram(
+    "moosefs_exporter_command_duration_seconds",
+    "Time spent waiting on mfscli, by section",
+    ["section"],
+    buckets=DURATION_BUCKETS,
+    registry=EXPORTER_REGISTRY,
+)
+PARSE_DURATION = Histogram(
+    "moosefs_exporter_parse_duration_seconds",
+    "Time spent parsing mfscli output, by section",
+    ["section"],
+    buckets=DURATION_BUCKETS,
+    registry=EXPORTER_REGISTRY,
+)
+COLLECT_DURATION = Histogram(
+    "moosefs_exporter_collect_duration_seconds",
+    "Time spent building a metrics snapshot, including fetching and parsing",
+    ["moosefs_master", "moosefs_master_port"],
+    buckets=DURATION_BUCKETS,
+    registry=EXPORTER_REGISTRY,
+)
+RENDER_DURATION = Histogram(
+    "moosefs_exporter_render_duration_seconds",
+    "Time spent serializing a snapshot for scrapes",
+    buckets=DURATION_BUCKETS,
+    registry=EXPORTER_REGISTRY,
+)
+COMMAND_TIMEOUTS = Counter(
+    "moosefs_exporter_command_timeouts",
+    "mfscli runs killed for taking longer than their timeout, by section",
+    ["section"],
+    registry=EXPORTER_REGISTRY,
+)
+COALESCED_REQUESTS = Counter(
+    "moosefs_exporter_coalesced_requests",
+    "Requests that waited for an identical operation already in progress instead of starting their own",
+    ["operation"],
+    registry=EXPORTER_REGISTRY,
+)
+BAD_LINES = Counter(
+    "moosefs_exporter_bad_lines",
+    "Lines of mfscli output that couldn't be parsed, by section",
+    ["section"],
+    registry=EXPORTER_REGISTRY,
+)
+LAST_SUCCESS = Gauge(
+    "moosefs_exporter_last_success_timestamp_seconds",
+    "When the last successful poll of a master finished",
+    ["moosefs_master", "moosefs_master_port"],
+    registry=EXPORTER_REGISTRY,
+)
+
+
+class TargetStatusCollector(Collector):
+    """
+    Reports how fresh each target's snapshot is at the moment of the scrape
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def collect(self):
+        labels = ["moosefs_master", "moosefs_master_port"]
+        age = GaugeMetricFamily(
+            "moosefs_exporter_snapshot_age_seconds",
+            "Seconds since the snapshot being served was taken",
+            labels=labels,
+        )
+        stale = GaugeMetricFamily(
+            "moosefs_exporter_stale",
+            "1 if the latest refresh of a section failed and older metrics for it are being served",
+            labels=labels + ["section"],
+        )
+        failures = GaugeMetricFamily(
+            "moosefs_exporter_consecutive_failures",
+            "Refreshes of a section that have failed in a row",
+            labels=labels + ["section"],
+        )
+        now = time.monotonic()
+        for collector in self.pool.collectors():
+            target = [collector.moosefs_master, str(collector.moosefs_master_port)]
+            if collector.last_refresh is not None:
+                age.add_metric(target, now - collector.last_refresh)
+            for section, count in collector.failures.items():
+                stale.add_metric(target + [section], 1 if collector.stale(section) else 0)
+                failures.add_metric(target + [section], count)
+        yield age
+        yield stale
+        yield failures
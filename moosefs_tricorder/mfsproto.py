@@ -0,0 +1,243 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+"""
+Minimal client for the moosefs master's binary stats protocol.
+
+This talks to the master on its client port (9421 by default) directly
+instead of forking mfscli for every poll. Only the two requests the exporter
+needs are implemented, and the answers are turned into the same data that
+load_master_metrics() and load_chunkserver_metrics() return.
+
+The record layouts follow what mfscli 3.0.x decodes. Only the fields we
+export are unpacked, each at a fixed offset from the start of its record,
+so fields the master appends in newer versions are ignored.
+"""
+
+import logging
+import socket
+import struct
+import threading
+import time
+
+from moosefs_tricorder.common import Chunkserver, ChunkserverListing
+
+# Packet types
+ANTOAN_NOP = 0
+CLTOMA_CSERV_LIST = 500
+MATOCL_CSERV_LIST = 501
+CLTOMA_INFO = 510
+MATOCL_INFO = 511
+
+# Every packet starts with a big-endian (type, length) header
+HEADER = struct.Struct(">LL")
+
+# flags, version (3 bytes), ip (4 bytes), port, csid, used, total, chunks,
+# todel used, todel total, todel chunks, error count, load, grace time,
+# labels bitmask, maintenance/removal status
+CSERV_RECORD = struct.Struct(">BBBBBBBBHHQQLQQLLLLLB")
+
+# version, memory usage, sys cpu, user cpu
+INFO_HEAD = struct.Struct(">HBBQQQ")
+# total, available, free, trash and sustained space and files, then
+# inode, directory, file, chunk and copy counts, none of which we export
+INFO_COUNTERS = struct.Struct(">QQQQLQLLLLLLL")
+# last successful metadata save, save duration, save status
+INFO_TAIL = struct.Struct(">LLB")
+INFO_TAIL_OFFSET = INFO_HEAD.size + INFO_COUNTERS.size
+
+CS_FLAG_DISCONNECTED = 0x01
+CS_FLAG_MAINTENANCE = 0x04
+CS_FLAG_TEMP_MAINTENANCE = 0x08
+
+# mfscli reports cpu usage in millionths of the wall clock
+CPU_SCALE = 10000.0
+
+SAVE_STATUS = {
+    0: "Saved in background",
+    1: "Downloaded from other master",
+    2: "Saved by master process",
+    3: "Saved by master process (background save failed)",
+}
+
+
+class ProtocolError(Exception):
+    """
+    The master sent something we didn't expect
+    """
+
+
+def format_labels(bitmask: int) -> str:
+    """
+    Turn a chunkserver label bitmask into the A,B,... form mfscli prints
+    """
+    labels = [chr(ord("A") + bit) for bit in range(26) if bitmask & (1 << bit)]
+    if not labels:
+        return "-"
+    return ",".join(labels)
+
+
+def format_maintenance(flags: int) -> str:
+    """
+    Turn chunkserver flags into mfscli's maintenance status strings
+    """
+    if flags & CS_FLAG_TEMP_MAINTENANCE:
+        return "maintenance_tmp_on"
+    if flags & CS_FLAG_MAINTENANCE:
+        return "maintenance_on"
+    return "maintenance_off"
+
+
+class MasterClient:
+    """
+    Keeps one connection to a moosefs master open across polls
+    """
+
+    def __init__(self, moosefs_master: str, moosefs_master_port: int, timeout: float = 10):
+        self.moosefs_master = moosefs_master
+        self.moosefs_master_port = moosefs_master_port
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def close(self):
+        """
+        Drop the connection to the master
+        """
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+    def _connect(self):
+        logging.debug(f"Connecting to {self.moosefs_master}:{self.moosefs_master_port}")
+        self._sock = socket.create_connection(
+            (self.moosefs_master, self.moosefs_master_port), timeout=self.timeout
+        )
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _recv_exactly(self, length: int) -> bytes:
+        buf = bytearray(length)
+        view = memoryview(buf)
+        received = 0
+        while received < length:
+            count = self._sock.recv_into(view[received:])
+            if count == 0:
+                raise ProtocolError("master closed the connection")
+            received += count
+        return bytes(buf)
+
+    def _exchange(self, cmd: int, answer: int, data: bytes) -> bytes:
+        self._sock.sendall(HEADER.pack(cmd, len(data)) + data)
+        while True:
+            reply_cmd, length = HEADER.unpack(self._recv_exactly(HEADER.size))
+            payload = self._recv_exactly(length)
+            # The master sends keepalives on idle connections
+            if reply_cmd == ANTOAN_NOP:
+                continue
+            if reply_cmd != answer:
+                raise ProtocolError(f"expected packet {answer}, got {reply_cmd}")
+            return payload
+
+    def command(self, cmd: int, answer: int, data: bytes = b"") -> bytes:
+        """
+        Send a request and return the payload of the answer.
+
+        A request on a connection the master has dropped is retried once
+        on a fresh connection.
+        """
+        with self._lock:
+            for attempt in (1, 2):
+                if self._sock is None:
+                    self._connect()
+                try:
+                    return self._exchange(cmd, answer, data)
+                except (OSError, ProtocolError) as e:
+                    self.close()
+                    if attempt == 2:
+                        raise
+                    logging.warning(f"Retrying command {cmd} after error: {e}")
+
+    def load_master_metrics(self) -> dict:
+        """
+        Load master metrics, mirroring common.load_master_metrics()
+        """
+        logging.info(f"Loading metrics for master node {self.moosefs_master}:{self.moosefs_master_port}...")
+        data = self.command(CLTOMA_INFO, MATOCL_INFO)
+        if len(data) < INFO_TAIL_OFFSET + INFO_TAIL.size:
+            raise ProtocolError(f"short MATOCL_INFO packet ({len(data)} bytes)")
+        v1, v2, v3, ram_used, sys_cpu, user_cpu = INFO_HEAD.unpack_from(data)
+        last_save, last_save_duration, last_save_status = INFO_TAIL.unpack_from(data, INFO_TAIL_OFFSET)
+
+        metrics = {}
+        metrics["all_cpu"] = (sys_cpu + user_cpu) / CPU_SCALE
+        # The stats packet doesn't carry these, and they aren't exported
+        metrics["exports_checksum"] = "-"
+        metrics["ip"] = self._sock.getpeername()[0] if self._sock else "-"
+        metrics["last_metadata_save"] = str(last_save)
+        metrics["last_save_duration"] = float(last_save_duration)
+        metrics["last_save_status"] = SAVE_STATUS.get(last_save_status, "Unknown")
+        metrics["local_time"] = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        metrics["master_host"] = self.moosefs_master
+        metrics["metadata_delay"] = "-"
+        metrics["metadata_version"] = "-"
+        metrics["ram_used"] = ram_used
+        metrics["state"] = "-"
+        metrics["sys_cpu"] = sys_cpu / CPU_SCALE
+        metrics["user_cpu"] = user_cpu / CPU_SCALE
+        metrics["version"] = f"{v1}.{v2}.{v3}"
+        logging.debug(metrics)
+        return metrics
+
+    def load_chunkserver_metrics(self) -> ChunkserverListing:
+        """
+        Load chunkserver metrics, mirroring common.load_chunkserver_metrics()
+        """
+        logging.info("Loading chunkserver metrics...")
+        data = self.command(CLTOMA_CSERV_LIST, MATOCL_CSERV_LIST)
+        if len(data) % CSERV_RECORD.size:
+            raise ProtocolError(f"MATOCL_CSERV_LIST length {len(data)} is not a multiple of {CSERV_RECORD.size}")
+        chunkservers = ChunkserverListing()
+        for record in CSERV_RECORD.iter_unpack(data):
+            (
+                flags,
+                v1,
+                v2,
+                v3,
+                ip1,
+                ip2,
+                ip3,
+                ip4,
+                port,
+                cs_id,
+                disk_used,
+                disk_total,
+                chunk_count,
+                _todel_used,
+                _todel_total,
+                _todel_chunks,
+                _error_count,
+                load,
+                _grace_time,
+                labels,
+                _removal_status,
+            ) = record
+            chunkserver = f"{ip1}.{ip2}.{ip3}.{ip4}"
+            # mfscli can't report usage for these either
+            if flags & CS_FLAG_DISCONNECTED:
+                logging.debug(f"{chunkserver}: disconnected, skipping")
+                continue
+            chunkservers.add(
+                Chunkserver(
+                    chunkserver,
+                    port,
+                    cs_id,
+                    format_labels(labels),
+                    f"{v1}.{v2}.{v3}",
+                    load,
+                    format_maintenance(flags),
+                    chunk_count,
+                    disk_used,
+                    disk_total,
+                )
+            )
+        return chunkservers
@@ -3,23 +3,97 @@
 # pyright: ignore reportMissingImports
 
 import logging
+import random
+import re
+import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from operator import attrgetter
 
-from moosefs_tricorder.cli import parse_master_cli
-from moosefs_tricorder.common import load_chunkserver_metrics, load_master_metrics
+from moosefs_tricorder import common
+from moosefs_tricorder.cli import DEFAULT_MASTER_PORT, parse_master_cli
+from moosefs_tricorder.common import (
+    CHUNK_STATES,
+    DEFAULT_TIMEOUTS,
+    MOUNT_OPERATIONS,
+    SECTIONS,
+    ChunkMatrix,
+    ChunkserverListing,
+    InvalidTarget,
+    TargetNotAllowed,
+    load_chunk_metrics,
+    load_chunkserver_metrics,
+    load_disk_metrics,
+    load_master_metrics,
+    load_mount_metrics,
+    prefetched,
+    section_commands,
+)
+from moosefs_tricorder.engine import AsyncEngine
+from moosefs_tricorder.exposition import ExpositionCache, RenderedExposition
+from moosefs_tricorder.instrumentation import (
+    COLLECT_DURATION,
+    EXPORTER_REGISTRY,
+    LAST_SUCCESS,
+    TargetStatusCollector,
+)
+from moosefs_tricorder.mfsproto import MasterClient
+from moosefs_tricorder.recording import Recorder, Replayer
+from moosefs_tricorder.server import start_exporter_server
+from moosefs_tricorder.sharding import Shard
+from moosefs_tricorder.singleflight import SingleFlight
+from moosefs_tricorder.sinks import PushgatewaySink, TextfileSink
+from moosefs_tricorder.topk import OTHER
+from moosefs_tricorder.trend import DEFAULT_CAPACITY, RingBuffers
 from prometheus_client import (  # pylint: disable=import-error
     GC_COLLECTOR,
     PLATFORM_COLLECTOR,
     PROCESS_COLLECTOR,
-    start_http_server,
+    generate_latest,
 )
 
 from prometheus_client.core import (  # pylint: disable=import-error
     REGISTRY,
+    CollectorRegistry,
     GaugeMetricFamily,
     InfoMetricFamily,
+    Metric,
 )
 from prometheus_client.registry import Collector  # pylint: disable=import-error
+from prometheus_client.samples import Sample  # pylint: disable=import-error
+
+# Hostnames and IPv4 addresses. Anything else, including a leading "-"
+# mfscli would take for an option, is rejected. MooseFS only speaks IPv4,
+# so IPv6 addresses, bare or as [v6]:port, are rejected too.
+TARGET_HOST = re.compile(r"[A-Za-z0-9][A-Za-z0-9._-]*")
+
+POLLS = SingleFlight("poll")
+
+# Sections the native protocol client fetches instead of mfscli
+NATIVE_SECTIONS = ("master", "chunkservers")
+
+# Shortest pause between scheduler passes
+MIN_SLEEP = 0.1
+
+# Per-chunkserver families as (name, help, Chunkserver attribute, type)
+CHUNKSERVER_FAMILIES = (
+    ("moosefs_chunkserver_chunk_count", "Chunk Count", "chunk_count", "gauge"),
+    ("moosefs_chunkserver_id", "Chunkserver ID", "cs_id", "gauge"),
+    ("moosefs_chunkserver_disk_total", "Disk total", "disk_total", "gauge"),
+    ("moosefs_chunkserver_disk_usage", "Disk usage %", "disk_usage", "gauge"),
+    ("moosefs_chunkserver_disk_used", "Disk used", "disk_used", "gauge"),
+    ("moosefs_chunkserver_labels", "Chunkserver labels", "labels", "info"),
+    ("moosefs_chunkserver_load", "Chunkserver load", "load", "gauge"),
+    ("moosefs_chunkserver_maintenance_status", "Chunkserver maintenance status", "maintenance", "info"),
+    ("moosefs_chunkserver_port", "Chunkserver port", "port", "gauge"),
+    ("moosefs_chunkserver_version", "Chunkserver version", "version", "info"),
+)
+
+# Every value a chunkserver's samples are built from, as one tuple
+CHUNKSERVER_VALUES = attrgetter(*(attr for _, _, attr, _ in CHUNKSERVER_FAMILIES))
 
 
 class MooseCollector(Collector):
@@ -28,20 +102,184 @@ class MooseCollector(Collector):
         moosefs_master_port: int = 80,
         polling_interval: int = 5,
         moosefs_master: str = "localhost",
+        client: MasterClient = None,
+        chunk_metrics: bool = False,
+        disk_metrics: bool = False,
+        timeouts: dict = None,
+        max_backoff: int = 300,
+        intervals: dict = None,
+        jitter: float = 0.0,
+        trend_samples: int = DEFAULT_CAPACITY,
+        mount_metrics: bool = False,
+        mount_top_k: int = 50,
+        shard: Shard = None,
     ):
+        self.client = client
+        self.chunk_metrics = chunk_metrics
+        self.disk_metrics = disk_metrics
+        self.mount_metrics = mount_metrics
+        self.mount_top_k = mount_top_k
+        self.shard = shard or Shard()
+        # Only the primary shard exports what isn't per chunkserver, so
+        # the others don't need to ask the master for it
+        primary = self.shard.primary
+        optional = {"master": primary, "chunks": chunk_metrics and primary, "disks": disk_metrics, "mounts": mount_metrics and primary}
+        self.sections = [section for section in SECTIONS if optional.get(section, True)]
+        # Seconds between refreshes of each section, and how far to randomly
+        # stretch or shrink each wait so sections and masters drift apart
+        self.intervals = {section: polling_interval for section in SECTIONS}
+        self.intervals.update(intervals or {})
+        self.jitter = jitter
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.max_backoff = max_backoff
         self.moosefs_master = moosefs_master
         self.moosefs_master_port = moosefs_master_port
         self.polling_interval_seconds = polling_interval
         logging.debug(f"moosefs_master {moosefs_master}")
         logging.debug(f"moosefs_master_port {moosefs_master_port}")
         logging.debug(f"polling_interval {polling_interval}")
+        # The snapshot is replaced wholesale by refresh() and never mutated,
+        # so collect() can hand it out without any locking.
+        self._snapshot = ()
+        self.last_refresh = None
+        # Each section's latest families, when it is next due, and how
+        # many times in a row it has failed
+        self._families = {section: () for section in self.sections}
+        self._next_due = {section: 0.0 for section in self.sections}
+        self.failures = {section: 0 for section in self.sections}
+        # Chunkserver name -> (port, label dict), chunkserver name -> the
+        # values its samples were built from, family name -> chunkserver
+        # name -> Sample, and family name -> Metric, carried between polls
+        self._cs_labels = {}
+        self._cs_values = {}
+        self._cs_samples = {}
+        self._cs_families = {}
+        # Recent disk usage, for fill rates
+        self._cs_trend = RingBuffers(trend_samples)
+        self._cluster_trend = RingBuffers(trend_samples)
 
     def collect(self):
         """
-        Collect moosefs statistics
+        Return the metrics gathered by the most recent refresh()
+        """
+        return iter(self._snapshot)
+
+    def stale(self, section: str) -> bool:
+        """
+        True when the metrics being served for a section aren't from its
+        latest attempt
+        """
+        return self.failures[section] > 0 or self.last_refresh is None
+
+    def poll(self, now: float = None) -> bool:
+        """
+        refresh() whichever sections are due.
+
+        Sections back off on their own: each consecutive failure of a
+        section doubles the wait before it is tried again, starting from
+        its own interval and up to max_backoff seconds, while its previous
+        metrics keep being served. Other sections carry on as normal.
+        Returns True if a refresh ran and every section in it succeeded.
+
+        Concurrent calls share a single refresh rather than each running
+        their own mfscli commands against the master.
+        """
+        return POLLS.do(self, self._poll, now)
+
+    def _poll(self, now: float = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+        due = self.due_sections(now)
+        if not due:
+            return False
+        try:
+            self.refresh(due)
+        except Exception as e:
+            logging.error(f"Failed to refresh {self.moosefs_master}:{self.moosefs_master_port}: {e}")
+            return False
+        return True
+
+    def due_sections(self, now: float) -> list:
+        """
+        Sections whose refresh interval has elapsed
+        """
+        return [section for section in self.sections if now >= self._next_due[section]]
+
+    def next_due(self) -> float:
+        """
+        When poll() next has something to do
+        """
+        return min(self._next_due.values())
+
+    def planned_commands(self, now: float) -> list:
+        """
+        The mfscli commands poll(now) would run, as (command, section,
+        timeout), so they can be fetched ahead of time
+        """
+        commands = []
+        for section in self.due_sections(now):
+            if self.client and section in NATIVE_SECTIONS:
+                continue
+            for command in section_commands(self.moosefs_master, self.moosefs_master_port, section):
+                commands.append((command, section, self.timeouts[section]))
+        return commands
+
+    def refresh(self, sections: list = None):
+        """
+        Poll the moosefs master for the given sections (all of them by
+        default) and replace the metrics snapshot.
+
+        Sections that aren't refreshed, or whose refresh fails, keep their
+        previous metrics in the new snapshot, and failed sections are
+        pushed back as described in poll(). The snapshot is only rebuilt if
+        some section succeeded. If any section failed, the first error is
+        raised afterwards.
+        """
+        if sections is None:
+            sections = self.sections
+        started = time.perf_counter()
+        error = None
+        refreshed = False
+        for section in sections:
+            section_started = time.monotonic()
+            interval = self.intervals[section]
+            try:
+                self._families[section] = tuple(getattr(self, f"_{section}_section")())
+            except Exception as e:
+                self.failures[section] += 1
+                interval = min(interval * 2 ** (self.failures[section] - 1), self.max_backoff)
+                logging.error(
+                    f"{self.moosefs_master}:{self.moosefs_master_port}: {section} failed "
+                    f"({self.failures[section]} in a row), next attempt in {interval:.0f}s: {e}"
+                )
+                error = error or e
+            else:
+                self.failures[section] = 0
+                refreshed = True
+            jitter = random.uniform(-self.jitter, self.jitter)
+            self._next_due[section] = section_started + interval * (1 + jitter)
+        labels = (self.moosefs_master, str(self.moosefs_master_port))
+        COLLECT_DURATION.labels(*labels).observe(time.perf_counter() - started)
+        if refreshed:
+            self._snapshot = tuple(family for section in self.sections for family in self._families[section])
+            self.last_refresh = time.monotonic()
+            LAST_SUCCESS.labels(*labels).set_to_current_time()
+        if error is not None:
+            raise error
+
+    def _master_section(self):
+        """
+        Collect moosefs master statistics
         """
         moosefs_master_port = str(self.moosefs_master_port)
-        master_data = load_master_metrics(moosefs_master=self.moosefs_master, moosefs_master_port=self.moosefs_master_port)
+        if self.client:
+            master_data = self.client.load_master_metrics()
+        else:
+            master_data = load_master_metrics(
+                moosefs_master=self.moosefs_master,
+                moosefs_master_port=self.moosefs_master_port,
+                timeout=self.timeouts["master"],
+            )
         # Master stats
         try:
             logging.info(f"Collecting master stats for {self.moosefs_master}:{self.moosefs_master_port}")
@@ -66,7 +304,7 @@ class MooseCollector(Collector):
                 labels=["moosefs_master", "moosefs_master_port"],
             )
             m_user_cpu = GaugeMetricFamily(
-                "moosefs_master_all_cpu",
+                "moosefs_master_user_cpu",
                 "moosefs master user cpu",
                 labels=["moosefs_master", "moosefs_master_port"],
             )
@@ -96,198 +334,588 @@ class MooseCollector(Collector):
             logging.error("Failed to create master metrics")
             logging.error(e)
 
-        chunkserver_data = load_chunkserver_metrics(moosefs_master=self.moosefs_master, moosefs_master_port=self.moosefs_master_port)
+    def _chunkservers_section(self):
+        """
+        Collect chunkserver and cluster statistics
+        """
+        if self.client:
+            chunkserver_data = self.client.load_chunkserver_metrics()
+        else:
+            chunkserver_data = load_chunkserver_metrics(
+                moosefs_master=self.moosefs_master,
+                moosefs_master_port=self.moosefs_master_port,
+                timeout=self.timeouts["chunkservers"],
+            )
         try:
             logging.debug("Parsing chunkserver data")
-            cs_labels = InfoMetricFamily(
-                "moosefs_chunkserver_labels",
-                "Chunkserver labels",
-                labels=["moosefs_master", "moosefs_master_port", "chunkserver", "port"],
-            )
-            cs_version = InfoMetricFamily(
-                "moosefs_chunkserver_version",
-                "Chunkserver version",
-                labels=["moosefs_master", "moosefs_master_port", "chunkserver", "port"],
-            )
-            cs_maintenance = InfoMetricFamily(
-                "moosefs_chunkserver_maintenance_status",
-                "Chunkserver maintenance status",
-                labels=["moosefs_master", "moosefs_master_port", "chunkserver", "port"],
-            )
-            cs_load = GaugeMetricFamily(
-                "moosefs_chunkserver_load", "Chunkserver load",
-                labels=["moosefs_master", "moosefs_master_port", "chunkserver", "port"]
-            )
-            cs_port = GaugeMetricFamily(
-                "moosefs_chunkserver_port", "Chunkserver port",
-                labels=["moosefs_master", "moosefs_master_port", "chunkserver", "port"]
-            )
-            cs_cs_id = GaugeMetricFamily(
-                "moosefs_chunkserver_id", "Chunkserver ID",
-                labels=["moosefs_master", "moosefs_master_port", "chunkserver", "port"]
-            )
-            cs_chunk_count = GaugeMetricFamily(
-                "moosefs_chunkserver_chunk_count", "Chunk Count",
-                labels=["moosefs_master", "moosefs_master_port", "chunkserver", "port"]
-            )
-            cs_disk_used = GaugeMetricFamily(
-                "moosefs_chunkserver_disk_used", "Disk used",
-                labels=["moosefs_master", "moosefs_master_port", "chunkserver", "port"]
-            )
-            cs_disk_total = GaugeMetricFamily(
-                "moosefs_chunkserver_disk_total", "Disk total",
-                labels=["moosefs_master", "moosefs_master_port", "chunkserver", "port"]
-            )
-            cs_disk_usage = GaugeMetricFamily(
-                "moosefs_chunkserver_disk_usage", "Disk usage %",
-                labels=["moosefs_master", "moosefs_master_port", "chunkserver", "port"]
-            )
+            now = time.monotonic()
+            chunkservers = chunkserver_data.chunkservers
+            if self.shard.count > 1:
+                chunkservers = {cs: chunkserver for cs, chunkserver in chunkservers.items() if self.shard.owns(cs)}
+                logging.debug(f"{self.shard}: {len(chunkservers)} of {chunkserver_data.chunkserver_count} chunkservers")
+            self._cs_trend.append(now, {cs: chunkserver.disk_used for cs, chunkserver in chunkservers.items()})
+            if self.shard.primary:
+                yield from self._cluster_metrics(chunkserver_data, now)
+            yield from self._chunkserver_metrics(chunkservers)
 
-            cluster_chunk_count = GaugeMetricFamily(
-                "moosefs_cluster_chunk_count",
-                "Total chunk count in MooseFS cluster",
-                labels=["cluster", "port"],
-            )
-            cluster_chunkserver_count = GaugeMetricFamily(
-                "moosefs_cluster_chunkserver_count",
-                "Chunkservers in MooseFS cluster",
-                labels=["cluster", "port"],
-            )
-            cluster_disk_total = GaugeMetricFamily(
-                "moosefs_cluster_disk_total",
-                "Total disk available in MooseFS cluster",
+        except Exception as e:
+            logging.critical(f"fail: {e}")
+
+    def _cluster_metrics(self, chunkserver_data: ChunkserverListing, now: float):
+        """
+        Cluster-wide totals from the chunkserver listing
+        """
+        moosefs_master_port = str(self.moosefs_master_port)
+        cluster_chunk_count = GaugeMetricFamily(
+            "moosefs_cluster_chunk_count",
+            "Total chunk count in MooseFS cluster",
+            labels=["cluster", "port"],
+        )
+        cluster_chunkserver_count = GaugeMetricFamily(
+            "moosefs_cluster_chunkserver_count",
+            "Chunkservers in MooseFS cluster",
+            labels=["cluster", "port"],
+        )
+        cluster_disk_total = GaugeMetricFamily(
+            "moosefs_cluster_disk_total",
+            "Total disk available in MooseFS cluster",
+            labels=["cluster", "port"],
+        )
+        cluster_disk_usage = GaugeMetricFamily(
+            "moosefs_cluster_disk_usage",
+            "Disk usage percentage in MooseFS cluster",
+            labels=["cluster", "port"],
+        )
+        cluster_disk_used = GaugeMetricFamily(
+            "moosefs_cluster_disk_used",
+            "Total disk used in MooseFS cluster",
+            labels=["cluster", "port"],
+        )
+        cluster_maintenance_count = GaugeMetricFamily(
+            "moosefs_cluster_maintenance_count",
+            "Chunkservers in maintenance mode in MooseFS cluster",
+            labels=["cluster", "port"],
+        )
+
+        labels = [self.moosefs_master, moosefs_master_port]
+
+        # Report aggregated cluster metrics, totalled up by the parser
+        logging.debug(f"mfs_chunk_count {chunkserver_data.chunk_count}")
+        logging.debug(f"mfs_chunkserver_count {chunkserver_data.chunkserver_count}")
+        logging.debug(f"mfs_disk_total {chunkserver_data.disk_total}")
+        logging.debug(f"mfs_disk_usage {chunkserver_data.disk_usage}")
+        logging.debug(f"mfs_disk_used {chunkserver_data.disk_used}")
+        logging.debug(f"mfs_maintenance_count {chunkserver_data.maintenance_count}")
+
+        cluster_chunk_count.add_metric(labels, chunkserver_data.chunk_count)
+        cluster_disk_total.add_metric(labels, chunkserver_data.disk_total)
+        cluster_disk_usage.add_metric(labels, chunkserver_data.disk_usage)
+        cluster_disk_used.add_metric(labels, chunkserver_data.disk_used)
+        cluster_maintenance_count.add_metric(labels, chunkserver_data.maintenance_count)
+        cluster_chunkserver_count.add_metric(labels, chunkserver_data.chunkserver_count)
+
+        self._cluster_trend.append(now, {"cluster": chunkserver_data.disk_used})
+        cluster_fill_rate = GaugeMetricFamily(
+            "moosefs_cluster_disk_fill_rate",
+            "Bytes per second disk usage in MooseFS cluster is growing by, over recent polls",
+            labels=["cluster", "port"],
+        )
+        cluster_time_to_full = GaugeMetricFamily(
+            "moosefs_cluster_disk_time_to_full_seconds",
+            "Seconds until MooseFS cluster disks are full at the current fill rate",
+            labels=["cluster", "port"],
+        )
+        rate = self._cluster_trend.rate("cluster")
+        if rate is not None:
+            cluster_fill_rate.add_metric(labels, rate)
+            if rate > 0:
+                remaining = max(chunkserver_data.disk_total - chunkserver_data.disk_used, 0)
+                cluster_time_to_full.add_metric(labels, remaining / rate)
+
+        # Cluster metrics
+        yield cluster_chunk_count
+        yield cluster_maintenance_count
+        yield cluster_disk_used
+        yield cluster_disk_total
+        yield cluster_disk_usage
+        yield cluster_chunkserver_count
+        yield cluster_fill_rate
+        yield cluster_time_to_full
+
+    def _chunks_section(self):
+        """
+        Collect chunk replication health, from the chunk matrix
+        """
+        # The native client doesn't speak the chunk matrix request either
+        chunk_data = load_chunk_metrics(
+            moosefs_master=self.moosefs_master,
+            moosefs_master_port=self.moosefs_master_port,
+            timeout=self.timeouts["chunks"],
+        )
+        yield from self._chunk_metrics(chunk_data)
+
+    def _chunk_metrics(self, chunk_data: ChunkMatrix):
+        """
+        Chunk counts per replication state, for the cluster and for each
+        storage class
+        """
+        logging.debug(f"Parsing chunk matrix for {len(chunk_data.offsets)} storage classes")
+        moosefs_master_port = str(self.moosefs_master_port)
+        states = chunk_data.states()
+        for state in CHUNK_STATES:
+            cluster = GaugeMetricFamily(
+                f"moosefs_cluster_{state}_chunks",
+                f"Chunks that are {state} in MooseFS cluster",
                 labels=["cluster", "port"],
             )
-            cluster_disk_usage = GaugeMetricFamily(
-                "moosefs_cluster_disk_usage",
-                "Disk usage percentage in MooseFS cluster",
-                labels=["cluster", "port"],
+            cluster.add_metric(
+                [self.moosefs_master, moosefs_master_port],
+                sum(counts[state] for counts in states.values()),
             )
-            cluster_disk_used = GaugeMetricFamily(
-                "moosefs_cluster_disk_used",
-                "Total disk used in MooseFS cluster",
-                labels=["cluster", "port"],
-            )
-            cluster_maintenance_count = GaugeMetricFamily(
-                "moosefs_cluster_maintenance_count",
-                "Chunkservers in maintenance mode in MooseFS cluster",
-                labels=["cluster", "port"],
+            yield cluster
+            by_class = GaugeMetricFamily(
+                f"moosefs_storage_class_{state}_chunks",
+                f"Chunks that are {state}, per storage class",
+                labels=["moosefs_master", "moosefs_master_port", "storage_class"],
             )
+            for storage_class, counts in states.items():
+                by_class.add_metric([self.moosefs_master, moosefs_master_port, storage_class], counts[state])
+            yield by_class
+
+    def _disks_section(self):
+        """
+        Collect per-disk statistics
+        """
+        # The native client doesn't speak the disk listing request
+        disk_data = load_disk_metrics(
+            moosefs_master=self.moosefs_master,
+            moosefs_master_port=self.moosefs_master_port,
+            timeout=self.timeouts["disks"],
+        )
+        if self.shard.count > 1:
+            # Disks go wherever their chunkserver does
+            disk_data = [disk for disk in disk_data if self.shard.owns(disk.chunkserver)]
+        yield from self._disk_metrics(disk_data)
+
+    def _mounts_section(self):
+        """
+        Collect client session and mount operation statistics for the
+        busiest mounts, with the rest summed into client="other"
+        """
+        # Nor does it speak the session listing requests
+        sessions, operations = load_mount_metrics(
+            moosefs_master=self.moosefs_master,
+            moosefs_master_port=self.moosefs_master_port,
+            top_k=self.mount_top_k,
+            timeout=self.timeouts["mounts"],
+        )
+        moosefs_master_port = str(self.moosefs_master_port)
+        logging.debug(f"{sessions.count} sessions, {operations.count} mounts with operation counters")
+        labelnames = ["moosefs_master", "moosefs_master_port", "client", "mount"]
+
+        mount_count = GaugeMetricFamily(
+            "moosefs_cluster_mount_count",
+            "Client sessions in MooseFS cluster",
+            labels=["cluster", "port"],
+        )
+        mount_count.add_metric([self.moosefs_master, moosefs_master_port], sessions.count)
+        yield mount_count
+
+        open_files = GaugeMetricFamily(
+            "moosefs_mount_open_files",
+            f"Files open by a client mount, for the {self.mount_top_k} with the most, the rest summed as client=\"other\"",
+            labels=labelnames,
+        )
+        for (client, mount), (files,) in sessions.items():
+            open_files.add_metric([self.moosefs_master, moosefs_master_port, client, mount], files)
+        if sessions.other is not None:
+            open_files.add_metric([self.moosefs_master, moosefs_master_port, OTHER, OTHER], sessions.other[0])
+        yield open_files
+
+        mount_operations = GaugeMetricFamily(
+            "moosefs_mount_operations",
+            f"Operations by a client mount this hour, for the {self.mount_top_k} busiest, the rest summed as client=\"other\"",
+            labels=labelnames + ["operation"],
+        )
+        mounts = operations.items()
+        if operations.other is not None:
+            mounts.append(((OTHER, OTHER), operations.other))
+        for (client, mount), counters in mounts:
+            for operation, counter in zip(MOUNT_OPERATIONS, counters):
+                mount_operations.add_metric(
+                    [self.moosefs_master, moosefs_master_port, client, mount, operation], counter
+                )
+        yield mount_operations
+
+    def _chunkserver_metrics(self, chunkservers: dict):
+        """
+        Per-chunkserver metrics for the chunkservers in this shard, rebuilt
+        incrementally.
+
+        Each chunkserver's label dict is built once and shared by all of its
+        samples. A chunkserver whose values are all unchanged is skipped
+        after a single tuple comparison, a sample is only replaced when its
+        value changes, and a family is only rebuilt when one of its samples
+        was. The families are still rendered in full.
+        """
+        moosefs_master_port = str(self.moosefs_master_port)
+        changed = set()
+
+        for cs in self._cs_labels.keys() - chunkservers.keys():
+            logging.debug(f"{cs}: gone, dropping its samples")
+            del self._cs_labels[cs]
+            del self._cs_values[cs]
+            for name, samples in self._cs_samples.items():
+                samples.pop(cs, None)
+                changed.add(name)
+
+        families = [
+            (name, attr, kind, self._cs_samples.setdefault(name, {}))
+            for name, _, attr, kind in CHUNKSERVER_FAMILIES
+        ]
+        for cs, chunkserver in chunkservers.items():
+            values = CHUNKSERVER_VALUES(chunkserver)
+            cached = self._cs_labels.get(cs)
+            relabelled = cached is None or cached[0] != chunkserver.port
+            if not relabelled and self._cs_values[cs] == values:
+                continue
+            self._cs_values[cs] = values
+            if relabelled:
+                labels = {
+                    "moosefs_master": self.moosefs_master,
+                    "moosefs_master_port": moosefs_master_port,
+                    "chunkserver": sys.intern(cs),
+                    "port": str(chunkserver.port),
+                }
+                self._cs_labels[cs] = (chunkserver.port, labels)
+            else:
+                labels = cached[1]
+            for (name, attr, kind, samples), value in zip(families, values):
+                sample = samples.get(cs)
+                if kind == "info":
+                    if relabelled or sample is None or sample.labels[attr] != value:
+                        samples[cs] = Sample(f"{name}_info", dict(labels, **{attr: value}), 1.0)
+                        changed.add(name)
+                elif relabelled or sample is None or sample.value != value:
+                    samples[cs] = Sample(name, labels, value)
+                    changed.add(name)
+
+        # Snapshots never mutate a family, so unchanged ones can be reused
+        for name, documentation, _, kind in CHUNKSERVER_FAMILIES:
+            family = self._cs_families.get(name)
+            if family is None or name in changed:
+                family = self._cs_families[name] = Metric(name, documentation, kind)
+                family.samples = list(self._cs_samples[name].values())
+            yield family
+
+        yield from self._chunkserver_trend_metrics(chunkservers)
+
+    def _chunkserver_trend_metrics(self, chunkservers: dict):
+        """
+        Per-chunkserver fill rate and time to full, from the disk usage
+        seen over recent polls. Time to full is left out for chunkservers
+        that aren't filling up.
+        """
+        fill_rate = Metric(
+            "moosefs_chunkserver_disk_fill_rate",
+            "Bytes per second disk usage is growing by, over recent polls",
+            "gauge",
+        )
+        time_to_full = Metric(
+            "moosefs_chunkserver_disk_time_to_full_seconds",
+            "Seconds until disks are full at the current fill rate",
+            "gauge",
+        )
+        for cs, chunkserver in chunkservers.items():
+            rate = self._cs_trend.rate(cs)
+            if rate is None:
+                continue
+            labels = self._cs_labels[cs][1]
+            fill_rate.samples.append(Sample(fill_rate.name, labels, rate))
+            if rate > 0:
+                remaining = max(chunkserver.disk_total - chunkserver.disk_used, 0)
+                time_to_full.samples.append(Sample(time_to_full.name, labels, remaining / rate))
+        yield fill_rate
+        yield time_to_full
+
+    def _disk_metrics(self, disks: list):
+        """
+        Per-disk metrics.
+
+        Chunkservers can have dozens of disks, so samples are appended to
+        the families directly with one label dict shared by all of a disk's
+        samples instead of a fresh one per add_metric() call.
+        """
+        logging.debug(f"Parsing {len(disks)} disks")
+        labelnames = ["moosefs_master", "moosefs_master_port", "chunkserver", "port", "path"]
+        families = {
+            "chunk_count": GaugeMetricFamily("moosefs_disk_chunk_count", "Chunks stored on disk", labels=labelnames),
+            "damaged": GaugeMetricFamily("moosefs_disk_damaged", "1 if the disk is damaged", labels=labelnames),
+            "error_count": GaugeMetricFamily("moosefs_disk_error_count", "Disk I/O errors", labels=labelnames),
+            "last_error": GaugeMetricFamily(
+                "moosefs_disk_last_error_timestamp", "Time of the last disk I/O error, 0 if none", labels=labelnames
+            ),
+            "used": GaugeMetricFamily("moosefs_disk_used", "Disk used", labels=labelnames),
+            "total": GaugeMetricFamily("moosefs_disk_total", "Disk total", labels=labelnames),
+            "usage": GaugeMetricFamily("moosefs_disk_usage", "Disk usage %", labels=labelnames),
+            "read_bytes_per_second": GaugeMetricFamily(
+                "moosefs_disk_read_bytes_per_second", "Disk read throughput", labels=labelnames
+            ),
+            "write_bytes_per_second": GaugeMetricFamily(
+                "moosefs_disk_write_bytes_per_second", "Disk write throughput", labels=labelnames
+            ),
+            "read_latency": GaugeMetricFamily(
+                "moosefs_disk_read_latency_seconds", "Average disk read latency", labels=labelnames
+            ),
+            "write_latency": GaugeMetricFamily(
+                "moosefs_disk_write_latency_seconds", "Average disk write latency", labels=labelnames
+            ),
+            "fsync_latency": GaugeMetricFamily(
+                "moosefs_disk_fsync_latency_seconds", "Average disk fsync latency", labels=labelnames
+            ),
+            "read_ops": GaugeMetricFamily("moosefs_disk_read_ops", "Disk read operations", labels=labelnames),
+            "write_ops": GaugeMetricFamily("moosefs_disk_write_ops", "Disk write operations", labels=labelnames),
+            "fsync_ops": GaugeMetricFamily("moosefs_disk_fsync_ops", "Disk fsync operations", labels=labelnames),
+        }
+        # (attribute, samples list, sample name) triples, resolved once
+        # rather than once per disk
+        targets = [(attr, family.samples, family.name) for attr, family in families.items()]
+        moosefs_master_port = str(self.moosefs_master_port)
+        for disk in disks:
+            labels = {
+                "moosefs_master": self.moosefs_master,
+                "moosefs_master_port": moosefs_master_port,
+                "chunkserver": disk.chunkserver,
+                "port": str(disk.port),
+                "path": disk.path,
+            }
+            for attr, samples, name in targets:
+                samples.append(Sample(name, labels, float(getattr(disk, attr))))
+        yield from families.values()
+
+
+class TargetPool(Collector):
+    """
+    MooseCollectors for several moosefs masters, keyed by "host:port".
+
+    Configured targets are polled concurrently in the background. /probe
+    requests can also ask for targets matching one of the probe_allow glob
+    patterns, which are polled on demand when their sections are due. Only
+    the max_probe_targets most recently probed of those are kept.
+    """
+
+    def __init__(
+        self,
+        targets: list,
+        polling_interval: int = 15,
+        max_workers: int = 8,
+        native_protocol: bool = False,
+        chunk_metrics: bool = False,
+        disk_metrics: bool = False,
+        timeouts: dict = None,
+        max_backoff: int = 300,
+        intervals: dict = None,
+        jitter: float = 0.0,
+        trend_samples: int = DEFAULT_CAPACITY,
+        mount_metrics: bool = False,
+        mount_top_k: int = 50,
+        engine: AsyncEngine = None,
+        shard: Shard = None,
+        probe_allow: list = (),
+        max_probe_targets: int = 32,
+    ):
+        self.polling_interval_seconds = polling_interval
+        self.native_protocol = native_protocol
+        self.chunk_metrics = chunk_metrics
+        self.disk_metrics = disk_metrics
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.max_backoff = max_backoff
+        self.intervals = intervals
+        self.jitter = jitter
+        self.trend_samples = trend_samples
+        self.mount_metrics = mount_metrics
+        self.mount_top_k = mount_top_k
+        self.engine = engine
+        self.shard = shard
+        self.probe_allow = list(probe_allow)
+        self.max_probe_targets = max_probe_targets
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="poller")
+        self._lock = threading.Lock()
+        self._collectors = {}
+        self._expositions = {}
+        # Keys of targets that were only ever probed, least recently used first
+        self._probed = OrderedDict()
+        self._snapshot = ()
+        # Bumped on every refresh so the /metrics rendering knows when
+        # it is out of date
+        self.generation = 0
+        for target in targets:
+            self._add(target)
+        self._configured = tuple(self._collectors.values())
 
-            # Aggregate some statistics about the cluster
-            mfs_chunk_count = 0
-            mfs_chunkserver_count = 0
-            mfs_disk_total = 0
-            mfs_disk_used = 0
-            mfs_maintenance_count = 0
-
-            for cs in chunkserver_data.keys():
-                mfs_chunkserver_count += 1
-                port = str(chunkserver_data[cs]["port"])
-                logging.debug(f"{cs}: {chunkserver_data[cs]}")
-                # First, all the Info metrics
-                if "labels" in chunkserver_data[cs]:
-                    logging.debug(
-                        f"{cs}: Adding label {chunkserver_data[cs]['labels']}"
-                    )
-                    cs_labels.add_metric(
-                        [self.moosefs_master, moosefs_master_port, cs, port], value={"labels": chunkserver_data[cs]["labels"]}
-                    )
-                if "maintenance" in chunkserver_data[cs]:
-                    logging.debug(
-                        f"{cs}: Adding maintenance {chunkserver_data[cs]['maintenance']}"
-                    )
-                    cs_maintenance.add_metric(
-                        [self.moosefs_master, moosefs_master_port, cs, port], value={"maintenance": chunkserver_data[cs]["maintenance"]}
-                    )
-                    if chunkserver_data[cs]["maintenance"] != "maintenance_off":
-                        mfs_maintenance_count += 1
-                if "version" in chunkserver_data[cs]:
-                    logging.debug(
-                        f"{cs}: Adding version {chunkserver_data[cs]['version']}"
-                    )
-                    cs_version.add_metric(
-                        [self.moosefs_master, moosefs_master_port, cs, port], value={"version": chunkserver_data[cs]["version"]}
-                    )
-                # Now all the gauges
-                if "chunk_count" in chunkserver_data[cs]:
-                    logging.debug(
-                        f"{cs}: Adding chunk_count {chunkserver_data[cs]['chunk_count']}"
-                    )
-                    mfs_chunk_count += int(chunkserver_data[cs]["chunk_count"])
-                    cs_chunk_count.add_metric([self.moosefs_master, moosefs_master_port, cs, port], chunkserver_data[cs]["chunk_count"])
-                if "cs_id" in chunkserver_data[cs]:
-                    logging.debug(f"{cs}: Adding cs_id {chunkserver_data[cs]['cs_id']}")
-                    cs_cs_id.add_metric([self.moosefs_master, moosefs_master_port, cs, port], chunkserver_data[cs]["cs_id"])
-                if "disk_total" in chunkserver_data[cs]:
-                    logging.debug(
-                        f"{cs}: Adding disk_total {chunkserver_data[cs]['disk_total']}"
-                    )
-                    cs_disk_total.add_metric([self.moosefs_master, moosefs_master_port, cs, port], chunkserver_data[cs]["disk_total"])
-                    mfs_disk_total += int(chunkserver_data[cs]["disk_total"])
-                if "disk_usage" in chunkserver_data[cs]:
-                    logging.debug(
-                        f"{cs}: Adding disk_usage {chunkserver_data[cs]['disk_usage']}"
-                    )
-                    cs_disk_usage.add_metric([self.moosefs_master, moosefs_master_port, cs, port], chunkserver_data[cs]["disk_usage"])
-                if "disk_used" in chunkserver_data[cs]:
-                    logging.debug(
-                        f"{cs}: Adding disk_used {chunkserver_data[cs]['disk_used']}"
-                    )
-                    cs_disk_used.add_metric([self.moosefs_master, moosefs_master_port, cs, port], chunkserver_data[cs]["disk_used"])
-                    mfs_disk_used += int(chunkserver_data[cs]["disk_used"])
-                if "load" in chunkserver_data[cs]:
-                    logging.debug(f"{cs}: Adding load {chunkserver_data[cs]['load']}")
-                    cs_load.add_metric([self.moosefs_master, moosefs_master_port, cs, port], chunkserver_data[cs]["load"])
-                if "port" in chunkserver_data[cs]:
-                    logging.debug(f"{cs}: Adding port {chunkserver_data[cs]['port']}")
-                    cs_port.add_metric([self.moosefs_master, moosefs_master_port, cs, port], int(chunkserver_data[cs]["port"]))
-
-            # Report aggregated cluster metrics
-            mfs_disk_usage = float(mfs_disk_used / mfs_disk_total)
-
-            logging.debug(f"mfs_chunk_count {mfs_chunk_count}")
-            logging.debug(f"mfs_chunkserver_count {mfs_chunkserver_count}")
-            logging.debug(f"mfs_disk_total {mfs_disk_total}")
-            logging.debug(f"mfs_disk_usage {mfs_disk_usage}")
-            logging.debug(f"mfs_disk_used {mfs_disk_used}")
-            logging.debug(f"mfs_maintenance_count {mfs_maintenance_count}")
-
-            cluster_chunk_count.add_metric([self.moosefs_master, moosefs_master_port], mfs_chunk_count)
-            cluster_disk_total.add_metric([self.moosefs_master, moosefs_master_port], mfs_disk_total)
-            cluster_disk_usage.add_metric([self.moosefs_master, moosefs_master_port], mfs_disk_usage)
-            cluster_disk_used.add_metric([self.moosefs_master, moosefs_master_port], mfs_disk_used)
-            cluster_maintenance_count.add_metric(
-                [self.moosefs_master, moosefs_master_port], mfs_maintenance_count
+    def _add(self, target: str) -> MooseCollector:
+        moosefs_master, moosefs_master_port = parse_target(target)
+        client = None
+        if self.native_protocol:
+            client = MasterClient(
+                moosefs_master=moosefs_master,
+                moosefs_master_port=moosefs_master_port,
+                timeout=self.timeouts["master"],
             )
-            cluster_chunkserver_count.add_metric(
-                [self.moosefs_master, moosefs_master_port], mfs_chunkserver_count
+        collector = MooseCollector(
+            moosefs_master=moosefs_master,
+            moosefs_master_port=moosefs_master_port,
+            polling_interval=self.polling_interval_seconds,
+            client=client,
+            chunk_metrics=self.chunk_metrics,
+            disk_metrics=self.disk_metrics,
+            timeouts=self.timeouts,
+            max_backoff=self.max_backoff,
+            intervals=self.intervals,
+            jitter=self.jitter,
+            trend_samples=self.trend_samples,
+            mount_metrics=self.mount_metrics,
+            mount_top_k=self.mount_top_k,
+            shard=self.shard,
+        )
+        registry = CollectorRegistry(auto_describe=True)
+        registry.register(collector)
+        key = f"{moosefs_master}:{moosefs_master_port}"
+        self._collectors[key] = collector
+        self._expositions[key] = ExpositionCache(registry)
+        return collector
+
+    def _evict(self, key: str):
+        """
+        Forget a probe-only target, along with its exporter metrics
+        """
+        logging.info(f"Evicting probed target {key}")
+        collector = self._collectors.pop(key)
+        del self._expositions[key]
+        if collector.client is not None:
+            collector.client.close()
+        labels = (collector.moosefs_master, str(collector.moosefs_master_port))
+        for metric in (COLLECT_DURATION, LAST_SUCCESS):
+            try:
+                metric.remove(*labels)
+            except KeyError:
+                pass
+
+    def collectors(self) -> list:
+        """
+        Every target's collector, including ones only seen in probes
+        """
+        with self._lock:
+            return list(self._collectors.values())
+
+    def collect(self):
+        """
+        Return the merged snapshot of every configured target
+        """
+        return iter(self._snapshot)
+
+    def refresh(self):
+        """
+        Poll every configured target concurrently, then merge their snapshots.
+
+        Only sections that are due get refreshed, and targets that fail keep
+        contributing their last good snapshot.
+        """
+        started = time.monotonic()
+        before = [collector.last_refresh for collector in self._configured]
+        outputs = {}
+        if self.engine is not None:
+            # Fetch every due command of every target at once, leaving the
+            # collectors only parsing to do
+            outputs = self.engine.fetch(
+                [command for collector in self._configured for command in collector.planned_commands(started)]
             )
+        futures = [
+            self._executor.submit(self._poll_prefetched, collector, started, outputs) for collector in self._configured
+        ]
+        for future in futures:
+            future.result()
+        if before == [collector.last_refresh for collector in self._configured]:
+            return
+        self._snapshot = merge_families(collector.collect() for collector in self._configured)
+        self.generation += 1
 
-            # Cluster metrics
-            yield cluster_chunk_count
-            yield cluster_maintenance_count
-            yield cluster_disk_used
-            yield cluster_disk_total
-            yield cluster_disk_usage
-            yield cluster_chunkserver_count
-
-            # If we do the yields inside the for loop, the output isn't
-            # consolidated properly - it'll repeat lines for each chunk server
-            # every time a new chunk server's stats are processed.
-            yield cs_chunk_count
-            yield cs_cs_id
-            yield cs_disk_total
-            yield cs_disk_usage
-            yield cs_disk_used
-            yield cs_labels
-            yield cs_load
-            yield cs_maintenance
-            yield cs_port
-            yield cs_version
+    @staticmethod
+    def _poll_prefetched(collector: MooseCollector, now: float, outputs: dict) -> bool:
+        with prefetched(outputs):
+            return collector.poll(now)
 
-        except Exception as e:
-            logging.critical(f"fail: {e}")
+    def next_due(self) -> float:
+        """
+        When the next configured target has something to refresh
+        """
+        if not self._configured:
+            return time.monotonic() + self.polling_interval_seconds
+        return min(collector.next_due() for collector in self._configured)
+
+    def probe(self, target: str) -> RenderedExposition:
+        """
+        Return the rendered metrics for a single target, polling it if any
+        of its sections are due.
+
+        If that poll fails, the last good snapshot is served instead. Only a
+        target we've never managed to poll is an error. Raises InvalidTarget
+        for a malformed target and TargetNotAllowed for one that is neither
+        configured nor allowed by probe_allow.
+        """
+        moosefs_master, moosefs_master_port = parse_target(target)
+        key = f"{moosefs_master}:{moosefs_master_port}"
+        with self._lock:
+            collector = self._collectors.get(key)
+            if collector is None or key in self._probed:
+                if not any(fnmatchcase(key, pattern) for pattern in self.probe_allow):
+                    raise TargetNotAllowed(f"{key} is not a configured target")
+                if collector is None:
+                    collector = self._add(key)
+                    while len(self._probed) >= self.max_probe_targets:
+                        self._evict(self._probed.popitem(last=False)[0])
+                self._probed[key] = True
+                self._probed.move_to_end(key)
+        if collector not in self._configured:
+            # Only refreshes whichever of its sections are due
+            self._executor.submit(collector.poll).result()
+        if collector.last_refresh is None:
+            raise Exception(f"no metrics collected from {key} yet")
+        return self._expositions[key].get(collector.last_refresh)
+
+
+def parse_target(target: str) -> tuple:
+    """
+    Split a host[:port] target, defaulting to the standard master port.
+
+    Raises InvalidTarget unless the host looks like a hostname or IPv4
+    address and the port is a port number.
+    """
+    if "[" in target or target.count(":") > 1:
+        raise InvalidTarget(f"{target!r} looks like an IPv6 address, which MooseFS doesn't support")
+    host, _, port = target.strip().rpartition(":")
+    if not host:
+        host, port = port, str(DEFAULT_MASTER_PORT)
+    if not TARGET_HOST.fullmatch(host) or not port.isdigit() or not 0 < int(port) < 65536:
+        raise InvalidTarget(f"{target!r} is not a valid host[:port]")
+    return (host, int(port))
+
+
+def merge_families(snapshots) -> tuple:
+    """
+    Combine several snapshots into one, merging families that share a name
+    so each metric only gets one HELP/TYPE header
+    """
+    snapshots = list(snapshots)
+    if len(snapshots) == 1:
+        return tuple(snapshots[0])
+    merged = {}
+    for snapshot in snapshots:
+        for family in snapshot:
+            if family.name not in merged:
+                merged[family.name] = Metric(family.name, family.documentation, family.type, family.unit)
+            merged[family.name].samples.extend(family.samples)
+    return tuple(merged.values())
 
 
 def cluster_metrics_collector():
@@ -297,20 +925,119 @@ def cluster_metrics_collector():
     REGISTRY.unregister(PLATFORM_COLLECTOR)
     REGISTRY.unregister(PROCESS_COLLECTOR)
 
+    targets = list(cli.target or [])
+    if cli.targets_file:
+        with open(cli.targets_file) as targets_file:
+            for line in targets_file:
+                line = line.split("#")[0].strip()
+                if line:
+                    targets.append(line)
+    if not targets:
+        targets = [f"{cli.moosefs_master}:{cli.master_port}"]
+
     logging.info("Loading mfsmaster scrape parameters...")
     logging.info(f"exporter_port: {cli.exporter_port}")
-    logging.info(f"moosefs_master: {cli.moosefs_master}")
-    logging.info(f"moosefs_master_port: {cli.master_port}")
+    logging.info(f"targets: {targets}")
+    logging.info(f"max_workers: {cli.max_workers}")
     logging.info(f"polling_interval_seconds: {cli.polling_interval}")
+    logging.info(f"native_protocol: {cli.native_protocol}")
+    logging.info(f"chunk_metrics: {cli.chunk_metrics}")
+    logging.info(f"disk_metrics: {cli.disk_metrics}")
+    logging.info(f"mount_metrics: {cli.mount_metrics} (top {cli.mount_top_k})")
+    logging.info(f"timeouts: master={cli.master_timeout}s chunkservers={cli.chunkserver_timeout}s chunks={cli.chunk_timeout}s disks={cli.disk_timeout}s mounts={cli.mount_timeout}s")
+    logging.info(f"max_backoff: {cli.max_backoff}")
+    logging.info(f"section_intervals: {dict(cli.section_interval or [])}")
+    logging.info(f"jitter: {cli.jitter}")
+    logging.info(f"trend_samples: {cli.trend_samples}")
+    logging.info(f"shard: {cli.shard_index} of {cli.shard_count}")
+    logging.info(f"probe_allow: {cli.probe_allow or []} (max {cli.max_probe_targets} probed targets)")
+    logging.info(f"async_engine: {cli.async_engine} (max_concurrency {cli.max_concurrency})")
+    if cli.record:
+        logging.info(f"recording mfscli output to {cli.record}")
+        common.RECORDER = Recorder(cli.record)
+    if cli.replay:
+        logging.info(f"replaying mfscli output from {cli.replay} at {cli.replay_speed}x")
+        common.REPLAYER = Replayer(cli.replay, speed=cli.replay_speed)
 
-    logging.info(f"Starting moosefs prometheus exporter on {cli.exporter_port}")
-    start_http_server(cli.exporter_port)
-    REGISTRY.register(
-        MooseCollector(
-            moosefs_master=cli.moosefs_master,
-            moosefs_master_port=cli.master_port,
-            polling_interval=cli.polling_interval,
-        )
+    pool = TargetPool(
+        targets=targets,
+        polling_interval=cli.polling_interval,
+        max_workers=cli.max_workers,
+        native_protocol=cli.native_protocol,
+        chunk_metrics=cli.chunk_metrics,
+        disk_metrics=cli.disk_metrics,
+        timeouts={
+            "master": cli.master_timeout,
+            "chunkservers": cli.chunkserver_timeout,
+            "chunks": cli.chunk_timeout,
+            "disks": cli.disk_timeout,
+            "mounts": cli.mount_timeout,
+        },
+        max_backoff=cli.max_backoff,
+        intervals=dict(cli.section_interval or []),
+        jitter=cli.jitter,
+        trend_samples=cli.trend_samples,
+        mount_metrics=cli.mount_metrics,
+        mount_top_k=cli.mount_top_k,
+        engine=AsyncEngine(cli.max_concurrency) if cli.async_engine else None,
+        shard=Shard(cli.shard_index, cli.shard_count),
+        probe_allow=cli.probe_allow or [],
+        max_probe_targets=cli.max_probe_targets,
     )
+    REGISTRY.register(pool)
+    EXPORTER_REGISTRY.register(TargetStatusCollector(pool))
+
+    # Shared by the HTTP server and the sinks so each poll is only rendered once
+    metrics = ExpositionCache(REGISTRY)
+    sinks = []
+    if cli.textfile:
+        sinks.append(TextfileSink(cli.textfile))
+    if cli.push_gateway:
+        sinks.append(PushgatewaySink(cli.push_gateway, cli.push_job))
+    logging.info(f"sinks: {sinks}")
+
+    if cli.no_http:
+        logging.info("Not starting the HTTP server")
+    else:
+        logging.info(f"Starting moosefs prometheus exporter on {cli.exporter_port}")
+        start_exporter_server(cli.exporter_port, pool, metrics=metrics)
+    poll_forever(pool, sinks=sinks, metrics=metrics)
+
+
+def publish(sinks: list, body: bytes):
+    """
+    Hand a rendered exposition to every sink, carrying on past failures
+    """
+    for sink in sinks:
+        try:
+            sink.publish(body)
+        except Exception as e:
+            logging.error(f"Failed to publish metrics to {sink}: {e}")
+
+
+def poll_forever(pool: TargetPool, sinks: list = (), metrics: ExpositionCache = None):
+    """
+    Refresh the pool's snapshot whenever a section of one of its targets
+    is due, and publish it to any sinks.
+
+    Scrapes only read the snapshot, so however slow the master is, it only
+    sees one set of mfscli calls per section interval no matter how many
+    scrapers are pointed at us.
+    """
+    if sinks and metrics is None:
+        metrics = ExpositionCache(REGISTRY)
     while True:
-        time.sleep(cli.polling_interval)
+        started = time.monotonic()
+        try:
+            pool.refresh()
+        except Exception as e:
+            logging.error(f"Failed to refresh metrics: {e}")
+        logging.debug(f"refresh took {time.monotonic() - started:.3f}s")
+        # There's nothing to publish until a poll has succeeded. After that
+        # publish every time round, even if no snapshot changed, so the
+        # exporter metrics keep showing targets going stale and failing.
+        if sinks and pool.generation:
+            rendered = metrics.get(pool.generation)
+            publish(sinks, rendered.body(openmetrics=False, gzipped=False, live=generate_latest(EXPORTER_REGISTRY)))
+        # Don't spin if something is overdue, e.g. a refresh that overran
+        time.sleep(max(pool.next_due() - time.monotonic(), MIN_SLEEP))
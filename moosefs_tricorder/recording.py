@@ -0,0 +1,162 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+"""
+Record raw mfscli output and play it back later.
+
+A recording is a directory of gzipped segments, each holding one JSON
+record per mfscli run with when it finished, which section it was for,
+the command line and everything it printed. Replaying a recording feeds
+the exporter the same output on the same schedule, optionally sped up,
+without a master or mfscli anywhere in sight - handy for reproducing
+parse failures, load testing and profiling against real clusters.
+"""
+
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+SEGMENT_PATTERN = "mfscli-*.jsonl.gz"
+
+# Start a new segment once the current one is this big or this old
+SEGMENT_BYTES = 64 * 2**20
+SEGMENT_SECONDS = 3600
+
+# How far into a recording to look for a command's first output when
+# replay starts before it was recorded
+LOOKAHEAD_SECONDS = 300
+
+
+class Recorder:
+    """
+    Appends mfscli output to a segmented, gzipped log in directory
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES, segment_seconds: float = SEGMENT_SECONDS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self._lock = threading.Lock()
+        self._raw = None
+        self._segment = None
+        self._segment_started = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def record(self, command: list, section: str, output: bytes):
+        # latin-1 maps every byte to a code point, so output round trips
+        # through JSON exactly whatever its encoding
+        entry = json.dumps(
+            {"time": time.time(), "section": section, "command": command, "output": output.decode("latin-1")}
+        )
+        with self._lock:
+            if self._segment is None or self._segment_full():
+                self._rotate()
+            self._segment.write(entry.encode() + b"\n")
+            # Sync flush so a crash only loses the gzip trailer, not records
+            self._segment.flush()
+
+    def _segment_full(self) -> bool:
+        if self._raw.tell() >= self.segment_bytes:
+            return True
+        return time.monotonic() - self._segment_started >= self.segment_seconds
+
+    def _rotate(self):
+        self._close_segment()
+        path = os.path.join(self.directory, f"mfscli-{time.time_ns() // 1000000:015d}.jsonl.gz")
+        logging.info(f"Recording mfscli output to {path}")
+        self._raw = open(path, "ab")
+        self._segment = gzip.GzipFile(fileobj=self._raw, mode="ab")
+        self._segment_started = time.monotonic()
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._raw.close()
+            self._segment = None
+            self._raw = None
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+
+def read_recording(directory: str):
+    """
+    Yield every record in a recording, oldest first.
+
+    A segment cut short by a crash is read up to where it was cut off.
+    """
+    segments = sorted(glob.glob(os.path.join(directory, SEGMENT_PATTERN)))
+    if not segments:
+        raise FileNotFoundError(f"no {SEGMENT_PATTERN} segments in {directory}")
+    for path in segments:
+        try:
+            with gzip.open(path, "rb") as segment:
+                for line in segment:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        logging.warning(f"{path}: skipping truncated record")
+                        continue
+                    record["output"] = record["output"].encode("latin-1")
+                    yield record
+        except (EOFError, gzip.BadGzipFile) as e:
+            logging.warning(f"{path}: segment ends early: {e}")
+
+
+class Replayer:
+    """
+    Serves recorded mfscli output in place of running mfscli.
+
+    The recording's clock starts at its first record when the Replayer is
+    created and runs speed times faster than real time. Each command gets
+    the latest output recorded for it as of that clock. Once the
+    recording runs out, the last output of each command keeps being
+    served.
+    """
+
+    def __init__(self, directory: str, speed: float = 1.0):
+        self.directory = directory
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._records = read_recording(directory)
+        self._latest = {}
+        self._pending = next(self._records, None)
+        if self._pending is None:
+            raise ValueError(f"{directory} has no records")
+        self._origin = self._pending["time"]
+        self._started = time.monotonic()
+        self._exhausted = False
+
+    def now(self) -> float:
+        """
+        Where replay is up to, in recording time
+        """
+        return self._origin + (time.monotonic() - self._started) * self.speed
+
+    def output(self, command: list) -> bytes:
+        """
+        The output command would have printed at this point in the recording
+        """
+        key = tuple(command)
+        with self._lock:
+            self._advance(self.now())
+            if key not in self._latest:
+                # Replay started before this command was first recorded
+                self._advance(self.now() + LOOKAHEAD_SECONDS, until=key)
+            if key not in self._latest:
+                raise LookupError(f"no recorded output for {' '.join(command)}")
+            return self._latest[key]
+
+    def _advance(self, until_time: float, until: tuple = None):
+        while self._pending is not None and self._pending["time"] <= until_time:
+            key = tuple(self._pending["command"])
+            self._latest[key] = self._pending["output"]
+            self._pending = next(self._records, None)
+            if key == until:
+                break
+        if self._pending is None and not self._exhausted:
+            self._exhausted = True
+            logging.info(f"Reached the end of the recording in {self.directory}")
@@ -0,0 +1,77 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+#
+# pyright: ignore reportMissingImports
+
+import logging
+import threading
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from moosefs_tricorder.common import InvalidTarget, TargetNotAllowed
+from moosefs_tricorder.exposition import ExpositionCache, serve
+from moosefs_tricorder.instrumentation import EXPORTER_REGISTRY
+from prometheus_client import make_wsgi_app  # pylint: disable=import-error
+from prometheus_client.core import REGISTRY  # pylint: disable=import-error
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+def make_exporter_app(pool, metrics: ExpositionCache = None):
+    """
+    WSGI app serving every configured target on /metrics, a single
+    target, blackbox exporter style, on /probe?target=host:port and the
+    exporter's own metrics on /exporter-metrics
+    """
+    if metrics is None:
+        metrics = ExpositionCache(REGISTRY)
+    exporter_metrics = make_wsgi_app(EXPORTER_REGISTRY)
+
+    def app(environ, start_response):
+        path = environ.get("PATH_INFO", "/")
+        if path == "/probe":
+            params = parse_qs(environ.get("QUERY_STRING", ""))
+            if "target" not in params:
+                start_response("400 Bad Request", [("Content-Type", "text/plain")])
+                return [b"target parameter is required\n"]
+            target = params["target"][0]
+            try:
+                rendered = pool.probe(target)
+            except InvalidTarget as e:
+                start_response("400 Bad Request", [("Content-Type", "text/plain")])
+                return [f"{e}\n".encode()]
+            except TargetNotAllowed as e:
+                start_response("403 Forbidden", [("Content-Type", "text/plain")])
+                return [f"{e}\n".encode()]
+            except Exception as e:
+                logging.error(f"Probe of {target} failed: {e}")
+                start_response("502 Bad Gateway", [("Content-Type", "text/plain")])
+                return [f"probe of {target} failed\n".encode()]
+            return serve(rendered, environ, start_response)
+        if path in ("/", "/metrics"):
+            return serve(metrics.get(pool.generation), environ, start_response)
+        if path == "/exporter-metrics":
+            return exporter_metrics(environ, start_response)
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"not found\n"]
+
+    return app
+
+
+def start_exporter_server(port: int, pool, addr: str = "0.0.0.0", metrics: ExpositionCache = None):
+    """
+    Serve the exporter from a daemon thread
+    """
+    httpd = make_server(
+        addr, port, make_exporter_app(pool, metrics), _ThreadingWSGIServer, handler_class=_QuietHandler
+    )
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd
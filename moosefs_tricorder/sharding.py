@@ -0,0 +1,61 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+"""
+Split one cluster's chunkservers between several exporter replicas.
+
+Chunkservers are assigned to shards by rendezvous hashing: every shard
+scores every chunkserver name and the highest score wins. Adding or
+removing a shard only moves the chunkservers that it wins or had won, so
+about 1/shard_count of the series move instead of nearly all of them.
+"""
+
+import hashlib
+
+# Forget cached assignments past this many, in case chunkservers churn
+MAX_CACHED = 1000000
+
+
+def shard_of(name: str, shard_count: int) -> int:
+    """
+    The shard, 0 to shard_count - 1, that name belongs to
+    """
+    encoded = name.encode()
+    return max(
+        range(shard_count),
+        key=lambda shard: hashlib.blake2b(encoded, digest_size=8, salt=shard.to_bytes(8, "big")).digest(),
+    )
+
+
+class Shard:
+    """
+    One exporter replica's share of the chunkservers.
+
+    Shard 0 is the primary, and also exports everything that isn't per
+    chunkserver - master metrics and the cluster-wide aggregates.
+    """
+
+    def __init__(self, index: int = 0, count: int = 1):
+        if not 0 <= index < count:
+            raise ValueError(f"shard index {index} is not between 0 and {count - 1}")
+        self.index = index
+        self.count = count
+        self._owned = {}
+
+    @property
+    def primary(self) -> bool:
+        return self.index == 0
+
+    def owns(self, name: str) -> bool:
+        """
+        Whether this shard exports the chunkserver called name
+        """
+        if self.count == 1:
+            return True
+        owned = self._owned.get(name)
+        if owned is None:
+            if len(self._owned) >= MAX_CACHED:
+                self._owned.clear()
+            owned = self._owned[name] = shard_of(name, self.count) == self.index
+        return owned
+
+    def __repr__(self):
+        return f"Shard({self.index}/{self.count})"
@@ -0,0 +1,61 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+"""
+Coalesce concurrent calls for the same work into one.
+
+When several scrapes want the same thing at once - a poll of a master, a
+rendering of a snapshot - the first one does the work and the others wait
+for it and share its result instead of repeating it.
+"""
+
+import threading
+
+from moosefs_tricorder.instrumentation import COALESCED_REQUESTS
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args):
+        """
+        Call fn(*args), or if a call for key is already running, wait for
+        it and return its result (or raise its exception)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            COALESCED_REQUESTS.labels(self.operation).inc()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
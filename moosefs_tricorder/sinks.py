@@ -0,0 +1,82 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+#
+# pyright: ignore reportMissingImports
+"""
+Places other than our own HTTP server to send metrics to.
+
+Sinks are handed the already rendered Prometheus text exposition after
+every poll, so using them doesn't cost another collection or rendering.
+"""
+
+import logging
+import os
+import tempfile
+import urllib.parse
+import urllib.request
+
+from prometheus_client.exposition import CONTENT_TYPE_LATEST  # pylint: disable=import-error
+
+# Seconds to wait for a Pushgateway to accept a push
+PUSH_TIMEOUT = 10
+
+
+class TextfileSink:
+    """
+    Writes metrics to a .prom file for node_exporter's textfile collector.
+
+    The file is written under a temporary name in the same directory,
+    fsynced and renamed over the old one, so node_exporter only ever reads
+    a complete file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+
+    def publish(self, body: bytes):
+        # node_exporter only reads *.prom, so it never sees the temporary file
+        fd, temporary = tempfile.mkstemp(dir=self.directory, prefix=".moosefs-tricorder-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as textfile:
+                textfile.write(body)
+                textfile.flush()
+                os.fsync(textfile.fileno())
+            os.chmod(temporary, 0o644)
+            os.replace(temporary, self.path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        # Make the rename itself survive a crash
+        directory = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        logging.debug(f"Wrote {len(body)} bytes to {self.path}")
+
+    def __repr__(self):
+        return f"TextfileSink({self.path!r})"
+
+
+class PushgatewaySink:
+    """
+    Pushes metrics to a Pushgateway, replacing everything previously pushed
+    for the job
+    """
+
+    def __init__(self, gateway: str, job: str, timeout: float = PUSH_TIMEOUT):
+        if "://" not in gateway:
+            gateway = f"http://{gateway}"
+        self.url = f"{gateway.rstrip('/')}/metrics/job/{urllib.parse.quote(job, safe='')}"
+        self.timeout = timeout
+
+    def publish(self, body: bytes):
+        request = urllib.request.Request(
+            self.url, data=body, method="PUT", headers={"Content-Type": CONTENT_TYPE_LATEST}
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+        logging.debug(f"Pushed {len(body)} bytes to {self.url}")
+
+    def __repr__(self):
+        return f"PushgatewaySink({self.url!r})"
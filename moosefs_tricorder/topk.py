@@ -0,0 +1,79 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+"""
+Keep only the heaviest few of a set of items, summing up the rest.
+
+Exporting a series per client mount would give Prometheus thousands of
+series that mostly say nothing. A TopK sums up the items added under each
+key, then keeps the k heaviest keys and folds everything lighter into one
+"other" total. A key's weight isn't known until every item has been added,
+so all of the keys are held until then, in memory proportional to the
+number of distinct keys rather than to k.
+"""
+
+import heapq
+from operator import add, itemgetter
+
+OTHER = "other"
+
+_weight = itemgetter(1)
+
+
+class TopK:
+    """
+    The k heaviest keys of a set of items, each with a tuple of values,
+    plus the element-wise sum of the values of everything else.
+
+    Items with the same key are summed, and ties go to the key added first.
+    """
+
+    def __init__(self, k: int):
+        self.k = k
+        # key -> (weight, values), in the order keys were first added
+        self._items = {}
+        # Items added, counting each one added under an existing key
+        self.count = 0
+        # (kept items, summed values of the rest, number of keys not kept),
+        # worked out when first asked for
+        self._ranked = None
+
+    def add(self, key, weight: float, values: tuple):
+        self.count += 1
+        previous = self._items.get(key)
+        if previous is not None:
+            weight += previous[0]
+            values = tuple(map(add, previous[1], values))
+        self._items[key] = (weight, values)
+        self._ranked = None
+
+    def _rank(self) -> tuple:
+        if self._ranked is None:
+            # nlargest is stable, so ties keep their insertion order
+            items = ((key, weight, values) for key, (weight, values) in self._items.items())
+            kept = heapq.nlargest(self.k, items, key=_weight)
+            kept_keys = {key for key, _, _ in kept}
+            other = None
+            for key, (_, values) in self._items.items():
+                if key not in kept_keys:
+                    other = values if other is None else tuple(map(add, other, values))
+            self._ranked = ([(key, values) for key, _, values in kept], other, len(self._items) - len(kept))
+        return self._ranked
+
+    def items(self) -> list:
+        """
+        The kept items as (key, values), heaviest first
+        """
+        return list(self._rank()[0])
+
+    @property
+    def other(self) -> tuple:
+        """
+        The summed values of every key not kept, or None if all were
+        """
+        return self._rank()[1]
+
+    @property
+    def other_count(self) -> int:
+        """
+        How many keys were summed into other
+        """
+        return self._rank()[2]
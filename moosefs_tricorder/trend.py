@@ -0,0 +1,94 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+"""
+Fixed-size history of recent samples, for estimating how fast things fill
+up without leaving it to deriv() and predict_linear() in PromQL.
+"""
+
+from array import array
+from operator import mul
+
+# Samples of history kept per series
+DEFAULT_CAPACITY = 60
+
+
+class RingBuffers:
+    """
+    The last capacity samples of several series that are sampled together,
+    like every chunkserver's disk usage from one listing.
+
+    Every series shares one ring of timestamps and keeps its values in a
+    preallocated array, so memory is fixed at 8 bytes per sample per
+    series. A series missing from a sample loses its history.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.times = array("d", [0.0]) * capacity
+        # Slot the next sample goes in
+        self.head = 0
+        # Series name -> [values, number of consecutive samples held]
+        self._series = {}
+        # Window length -> (centered times, sum of their squares) for the
+        # current head, shared by every series with that much history
+        self._windows = {}
+
+    def __len__(self):
+        return len(self._series)
+
+    def append(self, timestamp: float, values: dict):
+        """
+        Record one sample of each series in values
+        """
+        slot = self.head
+        capacity = self.capacity
+        self.times[slot] = timestamp
+        series = self._series
+        for name in series.keys() - values.keys():
+            del series[name]
+        for name, value in values.items():
+            entry = series.get(name)
+            if entry is None:
+                entry = series[name] = [array("d", [0.0]) * capacity, 0]
+            entry[0][slot] = value
+            if entry[1] < capacity:
+                entry[1] += 1
+        self.head = (slot + 1) % capacity
+        self._windows = {}
+
+    def _window(self, ring: array, length: int) -> array:
+        """
+        The last length entries of ring, oldest first
+        """
+        start = self.head - length
+        if start >= 0:
+            return ring[start : self.head]
+        return ring[start:] + ring[: self.head]
+
+    def _centered_times(self, length: int) -> tuple:
+        window = self._windows.get(length)
+        if window is None:
+            times = self._window(self.times, length)
+            # Offset from the oldest time first so large timestamps don't
+            # lose precision in the sum
+            oldest = times[0]
+            mean = sum(t - oldest for t in times) / length
+            centered = array("d", [t - oldest - mean for t in times])
+            window = self._windows[length] = (centered, sum(map(mul, centered, centered)))
+        return window
+
+    def rate(self, name: str) -> float:
+        """
+        Least squares slope of a series in units per second, like PromQL's
+        deriv(), or None until it has two samples
+        """
+        values, length = self._series[name]
+        if length < 2:
+            return None
+        centered, squares = self._centered_times(length)
+        if not squares:
+            return None
+        # The centered times only sum to zero up to rounding, which large
+        # values would magnify, so offset them from the oldest one
+        window = self._window(values, length)
+        oldest = window[0]
+        return sum(t * (v - oldest) for t, v in zip(centered, window)) / squares
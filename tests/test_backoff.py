@@ -0,0 +1,63 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+from prometheus_client.core import GaugeMetricFamily  # pylint: disable=import-error
+
+from moosefs_tricorder.moosefs import MooseCollector
+
+
+def failing():
+    raise Exception("mfscli exited 1.")
+
+
+def collector_with_failing_disks() -> MooseCollector:
+    collector = MooseCollector(polling_interval=10, disk_metrics=True, max_backoff=60)
+    for section in collector.sections:
+        family = GaugeMetricFamily(f"moosefs_test_{section}", "test")
+        setattr(collector, f"_{section}_section", lambda family=family: iter([family]))
+    collector._disks_section = failing
+    return collector
+
+
+def test_failing_section_does_not_starve_the_others(monkeypatch):
+    collector = collector_with_failing_disks()
+    now = [1000.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+    assert not collector.poll()
+    assert collector.failures["disks"] == 1
+    assert collector.failures["master"] == 0
+    assert not collector.stale("master")
+    assert collector.stale("disks")
+    assert "moosefs_test_master" in {family.name for family in collector.collect()}
+
+    # After a second failure disks waits twice as long, the rest don't
+    now[0] += 10
+    assert collector.due_sections(now[0]) == collector.sections
+    collector.poll()
+    assert collector.failures["disks"] == 2
+    now[0] += 10
+    assert collector.due_sections(now[0]) == [section for section in collector.sections if section != "disks"]
+    collector.poll()
+    now[0] += 10
+    assert "disks" in collector.due_sections(now[0])
+
+
+def test_backoff_doubles_from_the_sections_interval_up_to_max_backoff(monkeypatch):
+    collector = collector_with_failing_disks()
+    now = [1000.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+    delays = []
+    for _ in range(5):
+        collector.refresh(["master"])
+        try:
+            collector.refresh(["disks"])
+        except Exception:
+            pass
+        delays.append(collector._next_due["disks"] - now[0])
+        now[0] = collector._next_due["disks"]
+    assert delays == [10, 20, 40, 60, 60]
+    assert collector.failures["disks"] == 5
+
+    collector._disks_section = lambda: iter(())
+    collector.refresh(["disks"])
+    assert collector.failures["disks"] == 0
+    assert not collector.stale("disks")
@@ -0,0 +1,57 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import pytest
+
+from moosefs_tricorder.common import MATRIX_SIZE, parse_chunk_matrix_line, parse_chunk_matrix_lines
+from moosefs_tricorder.moosefs import MooseCollector
+
+
+def row(storage_class: str, goal: str, counts: list) -> str:
+    return f"chunks matrix^{storage_class}^{goal}^{'^'.join(map(str, counts))}"
+
+
+def test_states_of_a_goal_2_row():
+    matrix = parse_chunk_matrix_lines([row("default", "2", [5, 3, 100, 7] + [0] * 7)])
+    assert matrix.states() == {"default": {"missing": 5, "endangered": 3, "undergoal": 3, "stable": 100, "overgoal": 7}}
+
+
+def test_goal_1_chunks_with_one_copy_are_not_endangered():
+    matrix = parse_chunk_matrix_lines([row("default", "1", [2, 50, 4] + [0] * 8)])
+    assert matrix.states() == {"default": {"missing": 2, "endangered": 0, "undergoal": 0, "stable": 50, "overgoal": 4}}
+
+
+def test_goal_0_copies_are_overgoal():
+    matrix = parse_chunk_matrix_lines([row("default", "0", [9] + [1] * 10)])
+    assert matrix.states() == {"default": {"missing": 0, "endangered": 0, "undergoal": 0, "stable": 0, "overgoal": 10}}
+
+
+def test_10_plus_row_and_column():
+    matrix = parse_chunk_matrix_lines([row("wide", "10+", [1] * MATRIX_SIZE)])
+    assert matrix.states() == {"wide": {"missing": 1, "endangered": 1, "undergoal": 9, "stable": 1, "overgoal": 0}}
+    assert parse_chunk_matrix_line(row("wide", "10+", [0] * MATRIX_SIZE))[1] == MATRIX_SIZE - 1
+
+
+def test_storage_classes_are_kept_apart_and_bad_lines_skipped():
+    matrix = parse_chunk_matrix_lines(
+        [
+            row("a", "2", [0, 0, 4] + [0] * 8).encode(),
+            b"garbage\n",
+            row("b", "3", [0, 1, 2, 3] + [0] * 7),
+            row("b", "11", [1] * MATRIX_SIZE),
+            "",
+        ]
+    )
+    states = matrix.states()
+    assert states["a"]["stable"] == 4
+    assert states["b"] == {"missing": 0, "endangered": 1, "undergoal": 3, "stable": 3, "overgoal": 0}
+
+
+@pytest.mark.parametrize("goal", ["11", "-1"])
+def test_goal_out_of_range(goal):
+    with pytest.raises(ValueError):
+        parse_chunk_matrix_line(row("default", goal, [0] * MATRIX_SIZE))
+
+
+def test_chunk_metrics_are_opt_in():
+    assert "chunks" not in MooseCollector().sections
+    assert "chunks" in MooseCollector(chunk_metrics=True).sections
@@ -0,0 +1,92 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+from moosefs_tricorder.common import Chunkserver, parse_chunkserver_lines
+from moosefs_tricorder.moosefs import MooseCollector
+
+
+def chunkserver(name: str, disk_used: int = 100, maintenance: str = "maintenance_off") -> Chunkserver:
+    return Chunkserver(name, 9422, 1, "A", "3.0.116", 0, maintenance, 10, disk_used, 1000)
+
+
+def chunkserver_families(collector: MooseCollector, chunkservers: list) -> dict:
+    collector._chunkserver_trend_metrics = lambda chunkservers: iter(())
+    return {family.name: family for family in collector._chunkserver_metrics({cs.name: cs for cs in chunkservers})}
+
+
+def test_unchanged_families_are_reused():
+    collector = MooseCollector()
+    first = chunkserver_families(collector, [chunkserver("a"), chunkserver("b")])
+    second = chunkserver_families(collector, [chunkserver("a"), chunkserver("b", disk_used=200)])
+    assert second["moosefs_chunkserver_load"] is first["moosefs_chunkserver_load"]
+    assert second["moosefs_chunkserver_disk_used"] is not first["moosefs_chunkserver_disk_used"]
+    assert [sample.value for sample in second["moosefs_chunkserver_disk_used"].samples] == [100, 200]
+    # The earlier family is left as it was for snapshots still holding it
+    assert [sample.value for sample in first["moosefs_chunkserver_disk_used"].samples] == [100, 100]
+
+
+def test_info_families_follow_label_changes():
+    collector = MooseCollector()
+    chunkserver_families(collector, [chunkserver("a")])
+    families = chunkserver_families(collector, [chunkserver("a", maintenance="maintenance_on")])
+    (sample,) = families["moosefs_chunkserver_maintenance_status"].samples
+    assert sample.name == "moosefs_chunkserver_maintenance_status_info"
+    assert sample.labels["maintenance"] == "maintenance_on"
+
+
+def test_departed_chunkservers_are_dropped():
+    collector = MooseCollector()
+    chunkserver_families(collector, [chunkserver("a"), chunkserver("b")])
+    families = chunkserver_families(collector, [chunkserver("b")])
+    for family in families.values():
+        assert [sample.labels["chunkserver"] for sample in family.samples] == ["b"]
+
+
+def line(name: str, chunk_count: int = 10, disk_used: int = 100, disk_total: int = 1000, maintenance="maintenance_off"):
+    return f"chunk servers^{name}^9422^1^A,B^3.0.116^4^{maintenance}^{chunk_count}^{disk_used}^{disk_total}"
+
+
+def test_parse_chunkserver_lines():
+    listing = parse_chunkserver_lines(
+        [line("10.0.0.1").encode() + b"\n", line("10.0.0.2", chunk_count=5, maintenance="maintenance_on"), ""]
+    )
+    assert listing.chunkserver_count == 2
+    first = listing.chunkservers["10.0.0.1"]
+    assert (first.port, first.cs_id, first.labels, first.version, first.load) == (9422, 1, "A,B", "3.0.116", 4)
+    assert (first.chunk_count, first.disk_used, first.disk_total) == (10, 100, 1000)
+    assert first.disk_usage == 0.1
+    assert (listing.chunk_count, listing.disk_used, listing.disk_total) == (15, 200, 2000)
+    assert listing.maintenance_count == 1
+    assert listing.disk_usage == 0.1
+
+
+def test_bad_lines_are_skipped():
+    listing = parse_chunkserver_lines(
+        [
+            "garbage",
+            "chunk servers^10.0.0.9^9422",
+            line("10.0.0.1"),
+            line("10.0.0.2").replace("^10^", "^ten^"),
+        ]
+    )
+    assert list(listing.chunkservers) == ["10.0.0.1"]
+    assert listing.chunk_count == 10
+
+
+def test_duplicate_chunkservers_keep_the_last_and_honest_totals():
+    listing = parse_chunkserver_lines(
+        [
+            line("10.0.0.1", chunk_count=10, disk_used=100, maintenance="maintenance_on"),
+            line("10.0.0.2"),
+            line("10.0.0.1", chunk_count=7, disk_used=300),
+        ]
+    )
+    assert listing.chunkserver_count == 2
+    assert listing.chunkservers["10.0.0.1"].chunk_count == 7
+    assert (listing.chunk_count, listing.disk_used, listing.disk_total) == (17, 400, 2000)
+    assert listing.maintenance_count == 0
+
+
+def test_zero_disk_total():
+    listing = parse_chunkserver_lines([line("10.0.0.1", disk_used=0, disk_total=0)])
+    assert listing.chunkservers["10.0.0.1"].disk_usage == 0.0
+    assert listing.disk_usage == 0.0
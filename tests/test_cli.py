@@ -0,0 +1,33 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import sys
+
+import pytest
+
+from moosefs_tricorder.cli import parse_master_cli
+
+
+def parse(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["moosefs-prometheus-exporter", *args])
+    return parse_master_cli()
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ("--polling-interval", "0"),
+        ("--polling-interval", "-15"),
+        ("--jitter", "-0.1"),
+        ("--jitter", "1"),
+        ("--jitter", "2.5"),
+    ],
+)
+def test_bad_schedules_are_rejected(monkeypatch, args):
+    with pytest.raises(SystemExit):
+        parse(monkeypatch, *args)
+
+
+def test_schedule_limits_are_accepted(monkeypatch):
+    cli = parse(monkeypatch, "--polling-interval", "1", "--jitter", "0")
+    assert (cli.polling_interval, cli.jitter) == (1, 0)
+    assert parse(monkeypatch, "--jitter", "0.99").jitter == 0.99
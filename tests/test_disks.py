@@ -0,0 +1,39 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import pytest
+
+from moosefs_tricorder.common import parse_disk_line, parse_disk_lines
+
+LINE = "disks^10.0.0.1:9422:/mnt/hdd1/^1500^2^1697000000^ok^1048576^2097152^250^500^1000^10^20^30^400^1000"
+
+
+def test_parse_disk_line():
+    disk = parse_disk_line(LINE)
+    assert (disk.chunkserver, disk.port, disk.path) == ("10.0.0.1", 9422, "/mnt/hdd1/")
+    assert (disk.chunk_count, disk.error_count, disk.last_error) == (1500, 2, 1697000000)
+    assert (disk.read_bytes_per_second, disk.write_bytes_per_second) == (1048576.0, 2097152.0)
+    assert (disk.read_latency, disk.write_latency, disk.fsync_latency) == (0.00025, 0.0005, 0.001)
+    assert (disk.read_ops, disk.write_ops, disk.fsync_ops) == (10, 20, 30)
+    assert (disk.used, disk.total, disk.usage) == (400, 1000, 0.4)
+    assert not disk.damaged
+
+
+def test_paths_may_contain_colons():
+    assert parse_disk_line(LINE.replace("/mnt/hdd1/", "/mnt/a:b/")).path == "/mnt/a:b/"
+
+
+def test_no_last_error_and_damaged_disks():
+    disk = parse_disk_line(LINE.replace("^1697000000^ok^", "^-^damaged^"))
+    assert disk.last_error == 0
+    assert disk.damaged
+
+
+def test_zero_total():
+    assert parse_disk_line(LINE.replace("^400^1000", "^0^0")).usage == 0.0
+
+
+@pytest.mark.parametrize("line", ["garbage", LINE.replace("^1500^", "^many^"), "disks^10.0.0.1^1500"])
+def test_bad_lines(line):
+    with pytest.raises(Exception):
+        parse_disk_line(line)
+    assert [disk.path for disk in parse_disk_lines([line, LINE.encode() + b"\n", ""])] == ["/mnt/hdd1/"]
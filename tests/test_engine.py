@@ -0,0 +1,138 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import os
+import time
+
+import pytest
+
+from moosefs_tricorder.common import CommandTimeout, mfscli, run, stream
+from moosefs_tricorder.engine import AsyncEngine
+from moosefs_tricorder.moosefs import TargetPool
+
+# Logs each run to $FAKE_MFSCLI_LOG, then answers like mfscli would.
+# FAKE_MFSCLI_SLEEP and FAKE_MFSCLI_EXIT make it slow or fail, and
+# FAKE_MFSCLI_PIDS makes it write its pid there and hang for good.
+FAKE_MFSCLI = """#!/bin/sh
+echo start >> "$FAKE_MFSCLI_LOG"
+if [ -n "$FAKE_MFSCLI_PIDS" ]; then
+    echo $$ >> "$FAKE_MFSCLI_PIDS"
+    exec sleep 60
+fi
+sleep "${FAKE_MFSCLI_SLEEP:-0}"
+echo end >> "$FAKE_MFSCLI_LOG"
+case "$*" in
+    *-SIM*)
+        echo "master servers_10.0.0.1_3.0.116_LEADER_1697000000_123456789_0_104857600_all:1.50% sys:0.50% user:1.00%_1697000000_0.5_Saved in background_0xDEADBEEF"
+        ;;
+    *-SCS*)
+        for i in 1 2 3; do
+            echo "chunk servers^10.0.0.$i^9422^$i^A^3.0.116^1^maintenance_off^100^100$i^1000"
+        done
+        ;;
+    *)
+        echo "$*"
+        ;;
+esac
+exit "${FAKE_MFSCLI_EXIT:-0}"
+"""
+
+
+@pytest.fixture
+def fake_mfscli(tmp_path, monkeypatch):
+    """
+    Put a fake mfscli first on PATH and return the file it logs runs to
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "mfscli"
+    script.write_text(FAKE_MFSCLI)
+    script.chmod(0o755)
+    log = tmp_path / "mfscli.log"
+    log.touch()
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_MFSCLI_LOG", str(log))
+    return log
+
+
+def most_at_once(log) -> int:
+    """
+    The most runs that were going at the same time, from the log
+    """
+    running = most = 0
+    for line in log.read_text().split():
+        running += 1 if line == "start" else -1
+        most = max(most, running)
+    return most
+
+
+def commands(count: int, timeout: float = 10) -> list:
+    return [(mfscli(f"master{i}", 9421, "-SIM", "-s_"), "master", timeout) for i in range(count)]
+
+
+def assert_gone(pid: int):
+    # A killed child that wasn't reaped would still be a zombie
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+
+
+def test_fetch_runs_commands_concurrently(fake_mfscli, monkeypatch):
+    monkeypatch.setenv("FAKE_MFSCLI_SLEEP", "0.5")
+    outputs = AsyncEngine(max_concurrency=6).fetch(commands(6))
+    assert most_at_once(fake_mfscli) == 6
+    assert len(outputs) == 6
+    assert all(output.startswith(b"master servers_") for output in outputs.values())
+
+
+def test_fetch_respects_max_concurrency(fake_mfscli, monkeypatch):
+    monkeypatch.setenv("FAKE_MFSCLI_SLEEP", "0.2")
+    AsyncEngine(max_concurrency=2).fetch(commands(6))
+    assert most_at_once(fake_mfscli) == 2
+    assert fake_mfscli.read_text().split().count("end") == 6
+
+
+def test_fetch_kills_and_reaps_commands_that_time_out(fake_mfscli, tmp_path, monkeypatch):
+    pids = tmp_path / "pids"
+    monkeypatch.setenv("FAKE_MFSCLI_PIDS", str(pids))
+    started = time.monotonic()
+    outputs = AsyncEngine().fetch(commands(2, timeout=0.3))
+    assert time.monotonic() - started < 5
+    assert all(isinstance(output, CommandTimeout) for output in outputs.values())
+    for pid in pids.read_text().split():
+        assert_gone(int(pid))
+
+
+def test_fetch_returns_failures_as_exceptions(fake_mfscli, monkeypatch):
+    monkeypatch.setenv("FAKE_MFSCLI_EXIT", "3")
+    (output,) = AsyncEngine().fetch(commands(1)).values()
+    assert isinstance(output, Exception)
+    assert "exited 3" in str(output)
+
+
+def test_refresh_parses_prefetched_output(fake_mfscli):
+    pool = TargetPool(targets=["master:9421"], engine=AsyncEngine())
+    pool.refresh()
+    # One run for each of the master and chunkserver commands, all by the
+    # engine; the collectors didn't run any of their own
+    assert fake_mfscli.read_text().split().count("start") == 2
+    families = {family.name: family for family in pool.collect()}
+    assert families["moosefs_cluster_chunkserver_count"].samples[0].value == 3
+
+
+def test_run_kills_and_reaps_commands_that_time_out(fake_mfscli, tmp_path, monkeypatch):
+    pids = tmp_path / "pids"
+    monkeypatch.setenv("FAKE_MFSCLI_PIDS", str(pids))
+    started = time.monotonic()
+    with pytest.raises(CommandTimeout):
+        run(mfscli("master", 9421, "-SIM", "-s_"), section="master", timeout=0.3)
+    assert time.monotonic() - started < 5
+    assert_gone(int(pids.read_text()))
+
+
+def test_stream_kills_and_reaps_commands_that_time_out(fake_mfscli, tmp_path, monkeypatch):
+    pids = tmp_path / "pids"
+    monkeypatch.setenv("FAKE_MFSCLI_PIDS", str(pids))
+    started = time.monotonic()
+    with pytest.raises(CommandTimeout):
+        list(stream(mfscli("master", 9421, "-SCS", "-s^"), section="chunkservers", timeout=0.3))
+    assert time.monotonic() - started < 5
+    assert_gone(int(pids.read_text()))
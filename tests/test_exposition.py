@@ -0,0 +1,101 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import gzip
+
+from prometheus_client import CollectorRegistry, Counter  # pylint: disable=import-error
+
+from moosefs_tricorder import exposition
+from moosefs_tricorder.exposition import ExpositionCache, serve
+from moosefs_tricorder.moosefs import TargetPool
+from moosefs_tricorder.server import make_exporter_app
+
+
+def scrape(rendered, **headers):
+    environ = {f"HTTP_{name.upper()}": value for name, value in headers.items()}
+    response = {}
+
+    def start_response(status, response_headers):
+        response["status"] = status
+        response["headers"] = dict(response_headers)
+
+    response["body"] = b"".join(serve(rendered, environ, start_response))
+    return response
+
+
+def rendering():
+    registry = CollectorRegistry()
+    Counter("moosefs_test", "test", registry=registry).inc()
+    return ExpositionCache(registry).get(1)
+
+
+def test_etag_and_last_modified_on_a_cached_body():
+    rendered = rendering()
+    first = scrape(rendered)
+    assert first["status"] == "200 OK"
+    assert scrape(rendered, if_none_match=first["headers"]["ETag"])["status"] == "304 Not Modified"
+    assert scrape(rendered, if_modified_since=first["headers"]["Last-Modified"])["status"] == "304 Not Modified"
+
+
+def test_formats_are_rendered_on_first_request(monkeypatch):
+    rendered = rendering()
+    renders = []
+    open_gzip = exposition.open_gzip
+    monkeypatch.setattr(exposition, "generate_latest", lambda registry: renders.append("text") or b"text\n")
+    monkeypatch.setattr(exposition, "generate_openmetrics", lambda registry: renders.append("om") or b"om\n# EOF\n")
+    monkeypatch.setattr(exposition, "open_gzip", lambda data: renders.append("gzip") or open_gzip(data))
+    assert scrape(rendered, accept_encoding="gzip")["status"] == "200 OK"
+    assert renders == ["text", "gzip"]
+    scrape(rendered)
+    scrape(rendered, accept_encoding="gzip")
+    assert renders == ["text", "gzip"]
+    assert scrape(rendered, accept="application/openmetrics-text")["body"] == b"om\n# EOF\n"
+    assert renders == ["text", "gzip", "om"]
+
+
+def test_rendering_sees_the_registry_as_it_was_collected():
+    registry = CollectorRegistry()
+    counter = Counter("moosefs_test", "test", registry=registry)
+    rendered = ExpositionCache(registry).get(1)
+    counter.inc()
+    assert b"moosefs_test_total 0.0" in rendered.body(openmetrics=False, gzipped=False)
+
+
+def test_representations_have_their_own_tags():
+    rendered = rendering()
+    plain = scrape(rendered)
+    zipped = scrape(rendered, accept_encoding="gzip")
+    openmetrics = scrape(rendered, accept="application/openmetrics-text")
+    assert len({plain["headers"]["ETag"], zipped["headers"]["ETag"], openmetrics["headers"]["ETag"]}) == 3
+    assert gzip.decompress(zipped["body"]) == plain["body"]
+    assert openmetrics["body"].endswith(b"# EOF\n")
+
+
+def get(app, path: str, **headers) -> dict:
+    environ = {"PATH_INFO": path, "REQUEST_METHOD": "GET", "QUERY_STRING": ""}
+    environ.update({f"HTTP_{name.upper()}": value for name, value in headers.items()})
+    response = {}
+
+    def start_response(status, response_headers):
+        response["status"] = status
+        response["headers"] = dict(response_headers)
+
+    response["body"] = b"".join(app(environ, start_response))
+    return response
+
+
+def test_validators_hold_between_polls_while_exporter_metrics_change():
+    registry = CollectorRegistry()
+    Counter("moosefs_test", "test", registry=registry).inc()
+    app = make_exporter_app(TargetPool(targets=[]), ExpositionCache(registry))
+
+    first = get(app, "/metrics")
+    assert b"moosefs_test_total 1.0" in first["body"]
+    assert b"moosefs_exporter_" not in first["body"]
+    exporter_metrics = get(app, "/exporter-metrics")
+    assert exporter_metrics["status"] == "200 OK"
+    assert b"moosefs_exporter_render_duration_seconds" in exporter_metrics["body"]
+    # A render in between changes the exporter metrics, not /metrics
+    ExpositionCache(registry).get(1).body(openmetrics=False, gzipped=False)
+    assert get(app, "/exporter-metrics")["body"] != exporter_metrics["body"]
+    assert get(app, "/metrics", if_none_match=first["headers"]["ETag"])["status"] == "304 Not Modified"
+    assert get(app, "/metrics", if_modified_since=first["headers"]["Last-Modified"])["status"] == "304 Not Modified"
@@ -0,0 +1,218 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import pytest
+
+from moosefs_tricorder.fakemaster import FakeChunkserver, FakeMaster, FakeMasterInfo
+from moosefs_tricorder.mfsproto import (
+    CLTOMA_CSERV_LIST,
+    CLTOMA_INFO,
+    CS_FLAG_DISCONNECTED,
+    CS_FLAG_MAINTENANCE,
+    CS_FLAG_TEMP_MAINTENANCE,
+    MasterClient,
+    ProtocolError,
+)
+
+
+# MATOCL_INFO as a 3.0.x master sends it, field by field per mfscli's
+# ">HBBQQQQQQQLQLLLLLLLLLB"
+GOLDEN_INFO = bytes.fromhex(
+    "0003 00 75"  # version 3.0.117
+    "00000000 00000800"  # memory usage, 2048
+    "00000000 000061a8"  # sys cpu, 25000
+    "00000000 0000c350"  # user cpu, 50000
+    "00000100 00000000"  # total space, 1 TiB
+    "00000080 00000000"  # available space
+    "00000090 00000000"  # free space
+    "00000000 00001000"  # trash space
+    "00000005"  # trash files
+    "00000000 00002000"  # sustained space
+    "00000002"  # sustained files
+    "000003e8"  # inodes
+    "00000064"  # directories
+    "00000384"  # files
+    "00000320"  # chunks
+    "00000640"  # all copies
+    "00000640"  # regular copies
+    "65262abb"  # last successful metadata save, 1697000123
+    "00000007"  # save duration
+    "02"  # save status, saved by master process
+)
+
+# Three MATOCL_CSERV_LIST records, field by field per mfscli's
+# ">BBBBBBBBHHQQLQQLLLLLB"
+GOLDEN_CSERV_LIST = bytes.fromhex(
+    "00"  # flags
+    "03 00 74"  # version 3.0.116
+    "0a 00 01 01"  # ip 10.0.1.1
+    "24ce"  # port 9422
+    "0001"  # id 1
+    "0000003e 80000000"  # used, 250 GiB
+    "000000fa 00000000"  # total, 1000 GiB
+    "0000002a"  # chunks, 42
+    "00000000 00000000"  # marked for removal used
+    "00000000 00000000"  # marked for removal total
+    "00000000"  # marked for removal chunks
+    "00000003"  # errors
+    "00000011"  # load, 17
+    "00000000"  # grace time
+    "00000005"  # labels A and C
+    "00"  # removal status
+    #
+    "0c"  # flags, temporary maintenance
+    "03 00 73"  # version 3.0.115
+    "0a 00 01 02"  # ip 10.0.1.2
+    "2532"  # port 9522
+    "0002"  # id 2
+    "00000000 00700000"  # used, 7 MiB
+    "0000003e 80000000"  # total, 250 GiB
+    "00010000"  # chunks, 65536
+    "00000000 00000000"
+    "00000000 00000000"
+    "00000000"
+    "00000000"
+    "00000000"  # load
+    "00000000"
+    "00000000"  # no labels
+    "00"
+    #
+    "01"  # flags, disconnected
+    "03 00 74"
+    "0a 00 01 03"  # ip 10.0.1.3
+    "24ce"
+    "0003"
+    "00000000 00000000"
+    "00000000 00000000"
+    "00000000"
+    "00000000 00000000"
+    "00000000 00000000"
+    "00000000"
+    "00000000"
+    "00000000"
+    "00000000"
+    "00000000"
+    "00"
+)
+
+
+class Canned:
+    """
+    Stands in for a FakeMasterInfo or FakeChunkserver, answering with
+    exactly these bytes
+    """
+
+    def __init__(self, payload: bytes):
+        self.payload = payload
+
+    def pack(self) -> bytes:
+        return self.payload
+
+
+@pytest.fixture
+def master():
+    with FakeMaster() as master:
+        yield master
+
+
+@pytest.fixture
+def client(master):
+    client = MasterClient("127.0.0.1", master.port, timeout=5)
+    yield client
+    client.close()
+
+
+def test_master_info(master, client):
+    master.info = FakeMasterInfo(
+        version=(3, 0, 117), ram_used=2048, sys_cpu=25000, user_cpu=50000, last_save=1697000123, last_save_duration=7
+    )
+    metrics = client.load_master_metrics()
+    assert metrics["version"] == "3.0.117"
+    assert metrics["ram_used"] == 2048
+    assert metrics["sys_cpu"] == 2.5
+    assert metrics["user_cpu"] == 5.0
+    assert metrics["all_cpu"] == 7.5
+    assert metrics["last_metadata_save"] == "1697000123"
+    assert metrics["last_save_duration"] == 7.0
+    assert metrics["last_save_status"] == "Saved in background"
+    assert metrics["ip"] == "127.0.0.1"
+
+
+def test_master_info_ignores_appended_fields(master, client):
+    master.info = FakeMasterInfo(last_save=1697000456, last_save_status=2, trailer=bytes(range(40)))
+    metrics = client.load_master_metrics()
+    assert metrics["last_metadata_save"] == "1697000456"
+    assert metrics["last_save_status"] == "Saved by master process"
+
+
+def test_short_master_info(master, client):
+    master.info = FakeMasterInfo(padding=b"")
+    with pytest.raises(ProtocolError):
+        client.load_master_metrics()
+
+
+def test_chunkserver_list(master, client):
+    master.chunkservers = [
+        FakeChunkserver("10.0.1.1", cs_id=1, disk_used=250, disk_total=1000, chunk_count=42, load=3, labels=0b101),
+        FakeChunkserver("10.0.1.2", port=9522, cs_id=2, version=(3, 0, 115)),
+    ]
+    listing = client.load_chunkserver_metrics()
+    first, second = (listing.chunkservers[name] for name in ("10.0.1.1", "10.0.1.2"))
+    assert (first.port, first.cs_id, first.labels, first.version) == (9422, 1, "A,C", "3.0.116")
+    assert (first.disk_used, first.disk_total, first.chunk_count, first.load) == (250, 1000, 42, 3)
+    assert first.maintenance == "maintenance_off"
+    assert (second.port, second.labels, second.version) == (9522, "-", "3.0.115")
+
+
+def test_chunkserver_flags(master, client):
+    master.chunkservers = [
+        FakeChunkserver("10.0.1.1", flags=CS_FLAG_DISCONNECTED),
+        FakeChunkserver("10.0.1.2", flags=CS_FLAG_MAINTENANCE),
+        FakeChunkserver("10.0.1.3", flags=CS_FLAG_MAINTENANCE | CS_FLAG_TEMP_MAINTENANCE),
+    ]
+    listing = client.load_chunkserver_metrics()
+    assert "10.0.1.1" not in listing.chunkservers
+    assert listing.chunkservers["10.0.1.2"].maintenance == "maintenance_on"
+    assert listing.chunkservers["10.0.1.3"].maintenance == "maintenance_tmp_on"
+
+
+def test_reconnects_after_the_master_drops_the_connection(master, client):
+    client.load_master_metrics()
+    master.drop_connections()
+    assert client.load_chunkserver_metrics() is not None
+    assert master.requests == [CLTOMA_INFO, CLTOMA_CSERV_LIST]
+    assert len(master.connections) == 1
+
+
+def test_gives_up_when_the_master_is_gone(master, client):
+    client.load_master_metrics()
+    master.drop_connections()
+    master.stop()
+    with pytest.raises((OSError, ProtocolError)):
+        client.load_master_metrics()
+
+
+def test_golden_master_info(master, client):
+    assert len(GOLDEN_INFO) == 109
+    master.info = Canned(GOLDEN_INFO)
+    metrics = client.load_master_metrics()
+    assert metrics["version"] == "3.0.117"
+    assert metrics["ram_used"] == 2048
+    assert (metrics["sys_cpu"], metrics["user_cpu"], metrics["all_cpu"]) == (2.5, 5.0, 7.5)
+    assert metrics["last_metadata_save"] == "1697000123"
+    assert metrics["last_save_duration"] == 7.0
+    assert metrics["last_save_status"] == "Saved by master process"
+
+
+def test_golden_chunkserver_list(master, client):
+    assert len(GOLDEN_CSERV_LIST) == 3 * 69
+    master.chunkservers = [Canned(GOLDEN_CSERV_LIST)]
+    listing = client.load_chunkserver_metrics()
+    assert sorted(listing.chunkservers) == ["10.0.1.1", "10.0.1.2"]
+    first, second = listing.chunkservers["10.0.1.1"], listing.chunkservers["10.0.1.2"]
+    assert (first.port, first.cs_id, first.version, first.labels, first.load) == (9422, 1, "3.0.116", "A,C", 17)
+    assert (first.disk_used, first.disk_total, first.chunk_count) == (250 * 2**30, 1000 * 2**30, 42)
+    assert first.maintenance == "maintenance_off"
+    assert (second.port, second.cs_id, second.version, second.labels, second.load) == (9522, 2, "3.0.115", "-", 0)
+    assert (second.disk_used, second.disk_total, second.chunk_count) == (7 * 2**20, 250 * 2**30, 65536)
+    assert second.maintenance == "maintenance_tmp_on"
+    assert (listing.chunk_count, listing.disk_used, listing.maintenance_count) == (42 + 65536, 250 * 2**30 + 7 * 2**20, 1)
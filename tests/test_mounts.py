@@ -0,0 +1,72 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+from moosefs_tricorder.common import (
+    MOUNT_OPERATIONS,
+    parse_mount_lines,
+    parse_mount_operations_line,
+    parse_session_line,
+)
+from moosefs_tricorder.topk import TopK
+
+
+def test_topk_keeps_the_heaviest_and_sums_the_rest():
+    top = TopK(2)
+    for key, weight in (("a", 5), ("b", 1), ("c", 9), ("d", 3), ("e", 7)):
+        top.add(key, weight, (weight, 1))
+    assert top.items() == [("c", (9, 1)), ("e", (7, 1))]
+    assert top.other == (5 + 1 + 3, 3)
+    assert (top.count, top.other_count) == (5, 3)
+
+
+def test_topk_without_spill():
+    top = TopK(3)
+    top.add("a", 1, (1,))
+    top.add("b", 1, (2,))
+    assert top.items() == [("a", (1,)), ("b", (2,))]
+    assert top.other is None
+    assert top.other_count == 0
+
+
+def test_topk_ties_keep_the_first_arrivals():
+    top = TopK(1)
+    top.add("first", 4, (4,))
+    top.add("second", 4, (4,))
+    assert top.items() == [("first", (4,))]
+    assert top.other == (4,)
+
+
+def test_topk_sums_items_with_the_same_key():
+    top = TopK(1)
+    top.add("a", 3, (3,))
+    top.add("b", 5, (5,))
+    top.add("a", 4, (4,))
+    assert top.items() == [("a", (7,))]
+    assert top.other == (5,)
+    assert (top.count, top.other_count) == (3, 1)
+    top.add("b", 5, (5,))
+    assert top.items() == [("b", (10,))]
+
+
+def test_duplicate_sessions_are_summed_before_ranking():
+    lines = [
+        "sessions^1^10.1.0.1^/mnt/a^3",
+        b"sessions^2^10.1.0.2^/mnt/b^5\n",
+        "sessions^3^10.1.0.1^/mnt/a^4",
+        "garbage",
+        "sessions^4^10.1.0.3^/mnt/c^1",
+    ]
+    sessions = parse_mount_lines(lines, 1, parse_session_line)
+    assert sessions.items() == [(("10.1.0.1", "/mnt/a"), (7,))]
+    assert sessions.other == (6,)
+    assert sessions.count == 4
+
+
+def test_duplicate_mount_operations_are_summed():
+    counters = "^".join(["1"] * len(MOUNT_OPERATIONS))
+    lines = [f"ops^10.1.0.1^/mnt/a^{counters}", f"ops^10.1.0.1^/mnt/a^{counters}", f"ops^10.1.0.2^/mnt/a^{counters}"]
+    operations = parse_mount_lines(lines, 5, parse_mount_operations_line)
+    assert operations.items() == [
+        (("10.1.0.1", "/mnt/a"), (2,) * len(MOUNT_OPERATIONS)),
+        (("10.1.0.2", "/mnt/a"), (1,) * len(MOUNT_OPERATIONS)),
+    ]
+    assert operations.other is None
@@ -0,0 +1,81 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import glob
+import os
+
+import pytest
+
+from moosefs_tricorder.recording import SEGMENT_PATTERN, Recorder, Replayer, read_recording
+
+MASTER = ["mfscli", "-SIM", "-H", "master", "-P", "9421", "-s_"]
+CHUNKSERVERS = ["mfscli", "-SCS", "-H", "master", "-P", "9421", "-s^"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"time": 1000.0, "monotonic": 50.0}
+    monkeypatch.setattr("time.time", lambda: now["time"])
+    monkeypatch.setattr("time.time_ns", lambda: int(now["time"] * 1e9))
+    monkeypatch.setattr("time.monotonic", lambda: now["monotonic"])
+    return now
+
+
+def record(directory, clock, entries, **kwargs):
+    recorder = Recorder(str(directory), **kwargs)
+    for at, command, section, output in entries:
+        clock["time"] = at
+        recorder.record(command, section, output)
+    recorder.close()
+
+
+def test_round_trip(tmp_path, clock):
+    # Not valid UTF-8, which must come back byte for byte
+    binary = b"chunk servers^\xff\xfe^9422\n"
+    record(
+        tmp_path,
+        clock,
+        [
+            (1000.0, MASTER, "master", b"first"),
+            (1005.0, CHUNKSERVERS, "chunkservers", binary),
+            (1010.0, MASTER, "master", b"second"),
+        ],
+    )
+    records = list(read_recording(str(tmp_path)))
+    assert [(r["time"], r["section"], r["command"], r["output"]) for r in records] == [
+        (1000.0, "master", MASTER, b"first"),
+        (1005.0, "chunkservers", CHUNKSERVERS, binary),
+        (1010.0, "master", MASTER, b"second"),
+    ]
+
+    replayer = Replayer(str(tmp_path), speed=2.0)
+    assert replayer.output(MASTER) == b"first"
+    # Looks ahead for commands first recorded after the replay started
+    assert replayer.output(CHUNKSERVERS) == binary
+    clock["monotonic"] += 5
+    assert replayer.output(MASTER) == b"second"
+    # The last output keeps being served once the recording runs out
+    clock["monotonic"] += 1000
+    assert replayer.output(MASTER) == b"second"
+    with pytest.raises(LookupError):
+        replayer.output(["mfscli", "-SHD"])
+
+
+def test_segments_rotate_and_are_read_in_order(tmp_path, clock):
+    record(tmp_path, clock, [(1000.0 + i, MASTER, "master", str(i).encode()) for i in range(3)], segment_bytes=1)
+    assert len(glob.glob(os.path.join(tmp_path, SEGMENT_PATTERN))) == 3
+    assert [r["output"] for r in read_recording(str(tmp_path))] == [b"0", b"1", b"2"]
+
+
+def test_truncated_segment_is_read_up_to_the_cut(tmp_path, clock):
+    record(tmp_path, clock, [(1000.0 + i, MASTER, "master", b"x" * 1000 + str(i).encode()) for i in range(50)])
+    (segment,) = glob.glob(os.path.join(tmp_path, SEGMENT_PATTERN))
+    with open(segment, "r+b") as f:
+        f.truncate(os.path.getsize(segment) - 20)
+    outputs = [r["output"] for r in read_recording(str(tmp_path))]
+    assert 0 < len(outputs) < 50
+    assert outputs[0].endswith(b"0")
+
+
+def test_empty_recording(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Replayer(str(tmp_path))
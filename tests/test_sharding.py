@@ -0,0 +1,43 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import pytest
+
+from moosefs_tricorder.sharding import Shard, shard_of
+
+NAMES = [f"10.{i // 250}.{i % 250}.1" for i in range(10000)]
+
+
+def test_every_name_has_exactly_one_shard():
+    shards = [Shard(index, 4) for index in range(4)]
+    for name in NAMES[:1000]:
+        assert sum(shard.owns(name) for shard in shards) == 1
+        assert shards[shard_of(name, 4)].owns(name)
+
+
+@pytest.mark.parametrize("count", [2, 3, 5])
+def test_shards_are_balanced(count):
+    sizes = [0] * count
+    for name in NAMES:
+        sizes[shard_of(name, count)] += 1
+    expected = len(NAMES) / count
+    assert all(abs(size - expected) < 0.1 * expected for size in sizes)
+
+
+def test_adding_a_shard_moves_about_one_in_n():
+    moved = [name for name in NAMES if shard_of(name, 4) != shard_of(name, 5)]
+    assert abs(len(moved) - len(NAMES) / 5) < 0.1 * len(NAMES) / 5
+    # Everything that moved went to the new shard
+    assert all(shard_of(name, 5) == 4 for name in moved)
+
+
+def test_single_shard_owns_everything():
+    shard = Shard()
+    assert shard.primary
+    assert all(shard.owns(name) for name in NAMES[:100])
+    assert not Shard(1, 2).primary
+
+
+@pytest.mark.parametrize("index,count", [(2, 2), (-1, 2), (0, 0)])
+def test_bad_shard_index(index, count):
+    with pytest.raises(ValueError):
+        Shard(index, count)
@@ -0,0 +1,71 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import threading
+import time
+
+import pytest
+
+from moosefs_tricorder.instrumentation import EXPORTER_REGISTRY
+from moosefs_tricorder.singleflight import SingleFlight
+
+CALLERS = 5
+
+
+def coalesced(operation: str) -> float:
+    return EXPORTER_REGISTRY.get_sample_value("moosefs_exporter_coalesced_requests_total", {"operation": operation}) or 0
+
+
+def run_concurrently(operation: str, outcome) -> tuple:
+    """
+    Call the same SingleFlight from CALLERS threads, holding the first call
+    open until the rest are waiting for it. Returns every caller's result
+    or exception, and how many times the work actually ran.
+    """
+    flight = SingleFlight(operation)
+    release = threading.Event()
+    calls = []
+    outcomes = [None] * CALLERS
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def call(i):
+        try:
+            outcomes[i] = flight.do("key", work)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while coalesced(operation) < CALLERS - 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return outcomes, len(calls)
+
+
+def test_concurrent_calls_share_one_result():
+    assert run_concurrently("test-result", "done") == (["done"] * CALLERS, 1)
+
+
+def test_errors_reach_every_waiting_caller():
+    error = ValueError("mfscli exited 1.")
+    assert run_concurrently("test-error", error) == ([error] * CALLERS, 1)
+
+
+def test_a_failed_call_does_not_stick():
+    flight = SingleFlight("test")
+
+    def fail():
+        raise ValueError("once")
+
+    with pytest.raises(ValueError):
+        flight.do("key", fail)
+    assert flight.do("key", lambda: "again") == "again"
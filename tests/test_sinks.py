@@ -0,0 +1,96 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import os
+import stat
+
+import pytest
+from prometheus_client import CollectorRegistry  # pylint: disable=import-error
+
+from moosefs_tricorder import moosefs
+from moosefs_tricorder.exposition import ExpositionCache
+from moosefs_tricorder.sinks import TextfileSink
+
+
+def test_textfile_is_replaced_whole(tmp_path):
+    path = tmp_path / "moosefs.prom"
+    sink = TextfileSink(str(path))
+    sink.publish(b"moosefs_test 1.0\n")
+    sink.publish(b"moosefs_test 2.0\n")
+    assert path.read_bytes() == b"moosefs_test 2.0\n"
+    assert stat.S_IMODE(path.stat().st_mode) == 0o644
+    assert os.listdir(tmp_path) == ["moosefs.prom"]
+
+
+def test_old_textfile_survives_a_failed_write(tmp_path, monkeypatch):
+    path = tmp_path / "moosefs.prom"
+    sink = TextfileSink(str(path))
+    sink.publish(b"moosefs_test 1.0\n")
+
+    def fail(source, destination):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        sink.publish(b"moosefs_test 2.0\n")
+    assert path.read_bytes() == b"moosefs_test 1.0\n"
+    assert os.listdir(tmp_path) == ["moosefs.prom"]
+
+
+def test_temporary_files_are_hidden_from_node_exporter(tmp_path, monkeypatch):
+    seen = []
+    real_replace = os.replace
+
+    def replace(source, destination):
+        seen.extend(os.listdir(tmp_path))
+        real_replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", replace)
+    TextfileSink(str(tmp_path / "moosefs.prom")).publish(b"moosefs_test 1.0\n")
+    (temporary,) = seen
+    assert temporary.startswith(".") and not temporary.endswith(".prom")
+
+
+class FakePool:
+    """
+    Stands in for a TargetPool whose first poll fails and later ones
+    succeed without changing anything
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self.refreshes = 0
+
+    def refresh(self):
+        self.refreshes += 1
+        if self.refreshes > 1:
+            self.generation = 1
+
+    def next_due(self) -> float:
+        return 0.0
+
+
+class Recorder:
+    def __init__(self):
+        self.bodies = []
+
+    def publish(self, body: bytes):
+        self.bodies.append(body)
+
+
+def test_sinks_wait_for_a_poll_then_publish_every_cycle(monkeypatch):
+    pool = FakePool()
+    sink = Recorder()
+    metrics = ExpositionCache(CollectorRegistry())
+    renders = []
+    monkeypatch.setattr(moosefs, "generate_latest", lambda registry: renders.append(None) or b"live %d\n" % len(renders))
+
+    def sleep(seconds):
+        if pool.refreshes == 3:
+            raise StopIteration
+
+    monkeypatch.setattr(moosefs.time, "sleep", sleep)
+    with pytest.raises(StopIteration):
+        moosefs.poll_forever(pool, sinks=[sink], metrics=metrics)
+    # Nothing after the failed first poll, then the same snapshot with
+    # fresh exporter metrics every time round
+    assert sink.bodies == [b"live 1\n", b"live 2\n"]
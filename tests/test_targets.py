@@ -0,0 +1,68 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import pytest
+
+from moosefs_tricorder.common import InvalidTarget, TargetNotAllowed
+from moosefs_tricorder.moosefs import MooseCollector, TargetPool, parse_target
+from moosefs_tricorder.server import make_exporter_app
+
+
+@pytest.mark.parametrize(
+    "target,expected",
+    [
+        ("mfsmaster", ("mfsmaster", 9421)),
+        ("mfsmaster:9500", ("mfsmaster", 9500)),
+        ("10.0.0.1:9421", ("10.0.0.1", 9421)),
+        (" mfs-master.example.com ", ("mfs-master.example.com", 9421)),
+        ("2001:db8::1", InvalidTarget),
+        ("[::1]:9421", InvalidTarget),
+    ],
+)
+def test_parse_target(target, expected):
+    if expected is InvalidTarget:
+        with pytest.raises(InvalidTarget, match="IPv6"):
+            parse_target(target)
+    else:
+        assert parse_target(target) == expected
+
+
+@pytest.mark.parametrize(
+    "target",
+    ["", "m2:abc", "m2:0", "m2:70000", "x;touch /tmp/pwned;echo:1", "-H:9421", "$(id):9421", "a b:9421"],
+)
+def test_parse_target_rejects(target):
+    with pytest.raises(InvalidTarget):
+        parse_target(target)
+
+
+def test_probe_refuses_unconfigured_targets():
+    pool = TargetPool(targets=["configured:9421"])
+    with pytest.raises(TargetNotAllowed):
+        pool.probe("elsewhere:9421")
+    assert len(pool.collectors()) == 1
+
+
+def test_probe_only_targets_are_capped(monkeypatch):
+    polled = []
+    monkeypatch.setattr(MooseCollector, "poll", lambda self: polled.append(self.moosefs_master))
+    pool = TargetPool(targets=[], probe_allow=["*.example.com:*"], max_probe_targets=2)
+    for host in ("a", "b", "c", "a"):
+        # Nothing was ever collected, so each probe raises, but the target is still kept
+        with pytest.raises(Exception, match="no metrics collected"):
+            pool.probe(f"{host}.example.com:9421")
+    assert polled == ["a.example.com", "b.example.com", "c.example.com", "a.example.com"]
+    assert sorted(collector.moosefs_master for collector in pool.collectors()) == ["a.example.com", "c.example.com"]
+
+
+def call(app, query: str) -> str:
+    statuses = []
+    app({"PATH_INFO": "/probe", "QUERY_STRING": query}, lambda status, headers: statuses.append(status))
+    return statuses[0]
+
+
+def test_probe_status_codes():
+    app = make_exporter_app(TargetPool(targets=["configured:9421"]))
+    assert call(app, "") == "400 Bad Request"
+    assert call(app, "target=m2:abc") == "400 Bad Request"
+    assert call(app, "target=x;touch%20/tmp/pwned;echo:1") == "400 Bad Request"
+    assert call(app, "target=elsewhere:9421") == "403 Forbidden"
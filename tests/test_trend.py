@@ -0,0 +1,59 @@
+# Copyright 2023 Joe Block <jpb@unixorn.net>
+
+import pytest
+
+from moosefs_tricorder.trend import RingBuffers
+
+
+def test_rate_of_a_known_slope():
+    buffers = RingBuffers(capacity=10)
+    for step in range(5):
+        buffers.append(100.0 + 15 * step, {"a": 1000 + 30 * step, "b": 500 - 15 * step})
+    assert buffers.rate("a") == pytest.approx(2.0)
+    assert buffers.rate("b") == pytest.approx(-1.0)
+
+
+def test_rate_after_wraparound_only_uses_the_window():
+    buffers = RingBuffers(capacity=4)
+    # A steep start that falls out of the window
+    for step in range(3):
+        buffers.append(float(step), {"a": 1000.0 * step})
+    for step in range(3, 11):
+        buffers.append(float(step), {"a": 2000.0 + 5 * step})
+    assert buffers.head == 11 % 4
+    assert buffers.rate("a") == pytest.approx(5.0)
+
+
+def test_rate_needs_two_samples():
+    buffers = RingBuffers(capacity=4)
+    buffers.append(1.0, {"a": 1.0})
+    assert buffers.rate("a") is None
+    buffers.append(2.0, {"a": 3.0})
+    assert buffers.rate("a") == pytest.approx(2.0)
+
+
+def test_series_that_skip_a_sample_start_over():
+    buffers = RingBuffers(capacity=4)
+    buffers.append(1.0, {"a": 1.0, "b": 1.0})
+    buffers.append(2.0, {"a": 2.0})
+    assert len(buffers) == 1
+    buffers.append(3.0, {"a": 3.0, "b": 100.0})
+    assert buffers.rate("b") is None
+    buffers.append(4.0, {"a": 4.0, "b": 110.0})
+    assert buffers.rate("b") == pytest.approx(10.0)
+    assert buffers.rate("a") == pytest.approx(1.0)
+
+
+def test_identical_timestamps_have_no_rate():
+    buffers = RingBuffers(capacity=4)
+    buffers.append(5.0, {"a": 1.0})
+    buffers.append(5.0, {"a": 2.0})
+    assert buffers.rate("a") is None
+
+
+def test_flat_series_with_large_values_and_timestamps_has_no_rate():
+    buffers = RingBuffers(capacity=60)
+    started = 1.7e9 + 0.123
+    for step in range(90):
+        buffers.append(started + 15.001 * step, {"a": 1e15 + 7})
+    assert buffers.rate("a") == 0.0